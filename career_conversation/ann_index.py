@@ -0,0 +1,171 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index in NumPy.
+
+IVFIndex is a drop-in VectorIndex: same keys/chunks, add/remove and
+search(query, k) -> [(score, entry position)]. Once the index holds
+`min_train` entries, a spherical k-means quantizer with ~sqrt(n) centroids is
+trained on a sample and every entry is assigned to its nearest centroid. A
+query then scores only the entries of its `nprobe` closest lists instead of
+the whole corpus. Below `min_train` entries (or before training) search is
+exact.
+
+Inserts are assigned to their nearest centroid on the fly and deletes reuse
+VectorIndex tombstones, so neither triggers retraining; the quantizer is
+retrained when the index has grown `retrain_growth` times since the last
+training. The centroids and the list of each embedding-store row are
+persisted next to knowledge.db, so a restart only assigns rows it has not
+seen before.
+"""
+
+import os
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from retrieval import VectorIndex, normalize_rows, top_k_scores
+
+ASSIGN_BLOCK_ROWS = 8192  # entries scored against the centroids at a time
+
+
+def _kmeans(sample: np.ndarray, nlist: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means: unit-length centroids maximizing cosine similarity."""
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = ~np.any(sums, axis=1)
+        if empty.any():
+            # Re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex(VectorIndex):
+
+    def __init__(self, vectors=None, nprobe: int = 8, min_train: int = 4096, retrain_growth: float = 4.0,
+                 train_sample_per_list: int = 40, kmeans_iterations: int = 10, seed: int = 0, **kwargs):
+        super().__init__(vectors=vectors, **kwargs)
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.retrain_growth = retrain_growth
+        self.train_sample_per_list = train_sample_per_list
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        # Inverted list of each entry (-1 = not assigned yet)
+        self._assign = np.full(self._rows.shape[0], -1, dtype=np.int32)
+
+    @classmethod
+    def from_rows(cls, keys: List[Hashable], chunks: List[str], rows: Sequence[int], vectors, **kwargs) -> "IVFIndex":
+        index = super().from_rows(keys, chunks, rows, vectors, **kwargs)
+        index._assign = np.full(index._rows.shape[0], -1, dtype=np.int32)
+        return index
+
+    def copy(self) -> "IVFIndex":
+        index = super().copy()
+        index._assign = self._assign.copy()
+        return index
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def add_rows(self, key: Hashable, chunks: List[str], rows: Sequence[int]):
+        super().add_rows(key, chunks, rows)
+        if not chunks:
+            return
+        if self.trained and len(self) < self.retrain_growth * self.trained_size:
+            # Positions looked up after adding: replacing the key may have compacted the index
+            positions = self._rows_by_key[key]
+            self._assign[positions] = np.argmax(self.vectors.take(self._rows[positions]) @ self.centroids.T, axis=1)
+        elif len(self) >= self.min_train:
+            self.train()
+
+    def train(self):
+        """(Re)train the quantizer on a sample of live entries and reassign every entry."""
+        live = np.flatnonzero(self._alive[:self._size])
+        if live.shape[0] == 0:
+            return
+        nlist = max(1, int(np.sqrt(live.shape[0])))
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(live.shape[0], nlist * self.train_sample_per_list)
+        sample = self.vectors.take(self._rows[np.sort(rng.choice(live, sample_size, replace=False))])
+        self.centroids = _kmeans(normalize_rows(sample), nlist, self.kmeans_iterations, rng)
+        self.trained_size = live.shape[0]
+        self._assign[:self._size] = -1
+        self._assign_missing()
+        print(f"IVF index trained: {nlist} lists over {live.shape[0]} entries", flush=True)
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        if not self.trained or len(self) < self.min_train or query.shape[0] != self.centroids.shape[1]:
+            return super().search(query, k)
+        probe = top_k_scores(self.centroids @ query, self.nprobe)
+        size = self._size
+        candidates = np.flatnonzero(self._alive[:size] & np.isin(self._assign[:size], probe))
+        if candidates.shape[0] == 0:
+            return []
+        scores = self.vectors.take(self._rows[candidates]) @ query
+        top = top_k_scores(scores, k)
+        return [(float(scores[i]), int(candidates[i])) for i in top]
+
+    # -------------------- persistence --------------------
+    def save(self, path: str):
+        """
+        Persist the centroids and, for a shared store backing, the list of
+        every assigned store row (store rows are stable across processes).
+        """
+        if not self.trained:
+            return
+        row_lists = np.zeros(0, dtype=np.int32)
+        if getattr(self.vectors, "shared", False):
+            assigned = np.flatnonzero(self._assign[:self._size] >= 0)
+            row_lists = np.full(len(self.vectors), -1, dtype=np.int32)
+            row_lists[self._rows[assigned]] = self._assign[assigned]
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=self.centroids, trained_size=np.int64(self.trained_size), row_lists=row_lists)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> bool:
+        """Adopt a persisted quantizer; entries whose rows it has not seen are assigned now."""
+        try:
+            with np.load(path) as data:
+                centroids = data["centroids"]
+                trained_size = int(data["trained_size"])
+                row_lists = data["row_lists"]
+        except (OSError, ValueError, KeyError):
+            return False
+        if self.vectors.dim is not None and centroids.shape[1] != self.vectors.dim:
+            return False
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = trained_size
+        rows = self._rows[:self._size]
+        known = rows < row_lists.shape[0]
+        self._assign[:self._size] = -1
+        self._assign[:self._size][known] = row_lists[rows[known]]
+        self._assign_missing()
+        return True
+
+    # -------------------- internals --------------------
+    def _assign_missing(self):
+        missing = np.flatnonzero(self._alive[:self._size] & (self._assign[:self._size] < 0))
+        for start in range(0, missing.shape[0], ASSIGN_BLOCK_ROWS):
+            block = missing[start:start + ASSIGN_BLOCK_ROWS]
+            self._assign[block] = np.argmax(self.vectors.take(self._rows[block]) @ self.centroids.T, axis=1)
+
+    def _reserve(self, extra: int):
+        super()._reserve(extra)
+        if self._assign.shape[0] < self._rows.shape[0]:
+            assign = np.full(self._rows.shape[0], -1, dtype=np.int32)
+            assign[:self._assign.shape[0]] = self._assign
+            self._assign = assign
+
+    def _after_compact(self, live: np.ndarray):
+        assign = np.full(max(self._rows.shape[0], live.shape[0]), -1, dtype=np.int32)
+        assign[:live.shape[0]] = self._assign[live]
+        self._assign = assign
@@ -1,375 +1,758 @@
 from dotenv import load_dotenv
-from openai import OpenAI
-import json
+from openai import AsyncOpenAI, OpenAI
+import asyncio
 import os
-import requests
+import re
 from pypdf import PdfReader
 import gradio as gr
-import math
-from typing import List, Tuple
-import sqlite3
+from typing import Annotated, Dict, Hashable, List, Optional, Tuple
+import threading
 import time
+import numpy as np
+from retrieval import VectorIndex, normalize_rows, normalize_vector, reciprocal_rank_fusion
+from embedding_cache import EmbeddingCache, content_hash
+from semantic_cache import SemanticCache
+from knowledge_db import FTS_STOPWORDS, KnowledgeDB, get_db
+from qa_writer import QAWriteBuffer, get_writer
+from notifier import PushoverDispatcher, get_dispatcher
+from warm_start import load_snapshot, save_snapshot
+from embedding_store import EmbeddingStore
+from chunking import chunk_profile, dedupe_chunks, qa_embedding_texts
+from tokens import count_message_tokens, count_tokens
+from history import HistoryCompactor
+from index_worker import IndexRefresher
+from ann_index import IVFIndex
+from embedding_backends import make_backend
+from tool_registry import ToolRegistry, TurnMemo
+from shared_index import (Entry, LeaderLock, VersionWatcher, entries_since, leader_lock_path, publish,
+                          qa_changes_since, read_mark, relog_all_qa)
 
 
 load_dotenv(override=True)
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+# "openai" embeds through the API; "local" uses an offline hashing model (no network round trip per turn).
+# Chosen per corpus: each backend keeps its own embedding cache entries, store and published index entries.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "1024"))
+# Embeddings API budgets (0 = unlimited) and how many token-sized batches are in flight at once
+EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "3000"))
+EMBEDDING_TPM = float(os.getenv("EMBEDDING_TPM", "1000000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+
+# Semantic answer cache: near-identical questions reuse a stored answer without a completion call
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+
+# Warm-start snapshot of extracted profile text + RAG index, validated against these sources
+PROFILE_SOURCES = ["me/linkedin.pdf", "me/summary.txt"]
+WARM_START_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_start")
+# Append-only float16 vectors shared read-only (memory-mapped) by every worker process
+# (default: WARM_START_DIR/store-<backend name>)
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR")
+
+# "full" inlines the whole summary + LinkedIn text in every system prompt; "retrieval"
+# sends a short persona prefix and only the top-k retrieved chunks, capped at a token budget
+PROMPT_MODES = ("full", "retrieval")
+PROMPT_MODE = os.getenv("PROMPT_MODE", "full")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1200"))
+
+# "ivf" searches an approximate inverted-file index once the corpus reaches IVF_MIN_TRAIN chunks
+# (exact search below that); "exact" always scans every chunk
+RETRIEVAL_INDEX = os.getenv("RETRIEVAL_INDEX", "ivf")
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_MIN_TRAIN = int(os.getenv("IVF_MIN_TRAIN", "4096"))
+
+# History compaction: the last N turns go verbatim, older ones as a rolling summary, all under a hard budget
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+
+# Auto-saved answers whose question embeds this close to a stored Q&A pair count as a hit on it instead
+QA_DUPLICATE_THRESHOLD = float(os.getenv("QA_DUPLICATE_THRESHOLD", "0.85"))
+
+# Background index refresh: wait for writes to be quiet this long, but refresh within the max delay
+INDEX_REFRESH_DEBOUNCE = float(os.getenv("INDEX_REFRESH_DEBOUNCE", "0.5"))
+INDEX_REFRESH_MAX_DELAY = float(os.getenv("INDEX_REFRESH_MAX_DELAY", "5"))
+
+# Upper bound on a single tool call in the async chat path (e.g. a slow Pushover request)
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "10"))
+
+# Schemas sent to the model are generated from the signatures of the @registry.tool functions below
+registry = ToolRegistry()
+
+def _notifier() -> PushoverDispatcher:
+    return get_dispatcher(os.path.join(os.path.dirname(__file__), "push_spool.db"))
+
 def push(text):
-    requests.post(
-        "https://api.pushover.net/1/messages.json",
-        data={
-            "token": os.getenv("PUSHOVER_TOKEN"),
-            "user": os.getenv("PUSHOVER_USER"),
-            "message": text,
-        }
-    )
+    # Queued for the background dispatcher: returns immediately, delivery is batched and retried
+    _notifier().notify(text)
 
 
-def record_user_details(email, name="Name not provided", notes="not provided"):
+@registry.tool("Use this tool to record that a user is interested in being in touch and provided an email address")
+def record_user_details(email: Annotated[str, "The email address of this user"],
+                        name: Annotated[str, "The user's name, if they provided it"] = "Name not provided",
+                        notes: Annotated[str, "Any additional information about the conversation that's worth recording to give context"] = "not provided"):
     push(f"Recording {name} with email {email} and notes {notes}")
     return {"recorded": "ok"}
 
-def record_unknown_question(question):
+@registry.tool("Always use this tool to record any question that couldn't be answered as you didn't know the answer")
+def record_unknown_question(question: Annotated[str, "The question that couldn't be answered"]):
     push(f"Recording {question}")
     return {"recorded": "ok"}
 
-record_user_details_json = {
-    "name": "record_user_details",
-    "description": "Use this tool to record that a user is interested in being in touch and provided an email address",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "email": {
-                "type": "string",
-                "description": "The email address of this user"
-            },
-            "name": {
-                "type": "string",
-                "description": "The user's name, if they provided it"
-            }
-            ,
-            "notes": {
-                "type": "string",
-                "description": "Any additional information about the conversation that's worth recording to give context"
-            }
-        },
-        "required": ["email"],
-        "additionalProperties": False
-    }
-}
-
-record_unknown_question_json = {
-    "name": "record_unknown_question",
-    "description": "Always use this tool to record any question that couldn't be answered as you didn't know the answer",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "question": {
-                "type": "string",
-                "description": "The question that couldn't be answered"
-            },
-        },
-        "required": ["question"],
-        "additionalProperties": False
-    }
-}
-
 # SQLite-backed common Q&A tools
 def _db_path() -> str:
     return os.path.join(os.path.dirname(__file__), "knowledge.db")
 
-def add_common_qa(question: str, answer: str):
-    conn = sqlite3.connect(_db_path())
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS qa (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT UNIQUE,
-                answer TEXT,
-                updated_at REAL
-            )
-        """)
-        now_ts = time.time()
-        cur.execute("INSERT INTO qa (question, answer, updated_at) VALUES (?, ?, ?) ON CONFLICT(question) DO UPDATE SET answer=excluded.answer, updated_at=excluded.updated_at", (question.strip(), answer.strip(), now_ts))
-        conn.commit()
-        return {"status": "ok", "updated_at": now_ts}
-    finally:
-        conn.close()
-
-def search_common_qa(query: str, top_k: int = 3):
-    conn = sqlite3.connect(_db_path())
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS qa (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT UNIQUE,
-                answer TEXT,
-                updated_at REAL
-            )
-        """)
-        like = f"%{query.strip()}%"
-        cur.execute("SELECT question, answer, updated_at FROM qa WHERE question LIKE ? OR answer LIKE ? ORDER BY updated_at DESC LIMIT ?", (like, like, top_k))
-        rows = cur.fetchall()
-        results = [{"question": q, "answer": a, "updated_at": ts} for (q, a, ts) in rows]
-        return {"results": results}
-    finally:
-        conn.close()
+def _ann_path(model: str, questions: bool = False) -> str:
+    """IVF quantizer for one embedding backend's chunk (or question) index, persisted alongside knowledge.db."""
+    return os.path.splitext(_db_path())[0] + f".ivf-{model}{'-questions' if questions else ''}.npz"
+
+def _db() -> KnowledgeDB:
+    return get_db(_db_path())
+
+def _qa_writer() -> QAWriteBuffer:
+    return get_writer(_db())
+
+@registry.tool("Upsert a common Q&A pair into the SQLite knowledge base for future reuse.")
+def add_common_qa(question: Annotated[str, "Canonical user question"], answer: Annotated[str, "Preferred answer to return"]):
+    # Write-behind: committed with other pending writes within QAWriteBuffer.flush_interval
+    now_ts = _qa_writer().upsert(question.strip(), answer.strip())
+    return {"status": "ok", "updated_at": now_ts}
+
+def record_qa_hit(question: str):
+    """Count another ask of a stored question (no re-embedding: updated_at is left alone)."""
+    _qa_writer().hit(question.strip())
+
+def get_qa_answer(question: str) -> Optional[str]:
+    """Current answer to a stored question, not-yet-committed upserts included."""
+    pending = _qa_writer().pending().get(question)
+    if pending is not None:
+        return pending[0]
+    row = _db().execute("SELECT answer FROM qa WHERE question = ?", (question,)).fetchone()
+    return row[0] if row else None
+
+def _overlay_pending(rows: List[Tuple[str, str, float, Optional[float]]], query: str, top_k: int) -> List[Tuple[str, str, float, Optional[float]]]:
+    """
+    Merge not-yet-committed upserts into keyword results: pending answers
+    replace stored ones, and pending rows sharing a query term come first,
+    ranked by matched terms (question matches weighted twice, as in BM25).
+    """
+    pending = _qa_writer().pending()
+    if not pending:
+        return rows
+    terms = set(re.findall(r"\w+", query.lower())) - FTS_STOPWORDS
+    matches = []
+    for q, (a, ts) in pending.items():
+        q_terms, a_terms = set(re.findall(r"\w+", q.lower())), set(re.findall(r"\w+", a.lower()))
+        weight = 2 * len(terms & q_terms) + len(terms & a_terms)
+        if weight:
+            matches.append((weight, q, a, ts))
+    matches.sort(key=lambda m: -m[0])
+    merged = [(q, a, ts, None) for _, q, a, ts in matches]
+    merged += [(q, a, ts, score) for q, a, ts, score in rows if q not in pending]
+    return merged[:top_k]
+
+def _search_qa_rows(query: str, top_k: int = 3) -> List[Tuple[str, str, float, Optional[float]]]:
+    """(question, answer, updated_at, score) rows for a keyword query, best first."""
+    return _overlay_pending(_db().search_qa(query, top_k), query, top_k)
+
+@registry.tool("Search the SQLite knowledge base for matching Q&A by keyword, ranked by relevance (BM25).", read_only=True)
+def search_common_qa(query: Annotated[str, "Search query (keywords)"],
+                     top_k: Annotated[int, "Max results to return"] = 3):
+    results = []
+    for q, a, ts, score in _search_qa_rows(query, top_k):
+        result = {"question": q, "answer": a, "updated_at": ts}
+        if score is not None:
+            result["score"] = round(score, 3)
+        results.append(result)
+    return {"results": results}
 
 def get_all_qa_pairs():
     """Get all Q&A pairs from the database for debugging"""
-    conn = sqlite3.connect(_db_path())
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS qa (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT UNIQUE,
-                answer TEXT,
-                updated_at REAL
-            )
-        """)
-        cur.execute("SELECT question, answer, updated_at FROM qa ORDER BY updated_at DESC")
-        rows = cur.fetchall()
-        results = [{"question": q, "answer": a, "updated_at": ts} for (q, a, ts) in rows]
-        return {"results": results, "count": len(results)}
-    finally:
-        conn.close()
-
-add_common_qa_json = {
-    "name": "add_common_qa",
-    "description": "Upsert a common Q&A pair into the SQLite knowledge base for future reuse.",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "question": {"type": "string", "description": "Canonical user question"},
-            "answer": {"type": "string", "description": "Preferred answer to return"}
-        },
-        "required": ["question", "answer"],
-        "additionalProperties": False
-    }
-}
-
-search_common_qa_json = {
-    "name": "search_common_qa",
-    "description": "Search the SQLite knowledge base for similar or matching Q&A by keyword.",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "query": {"type": "string", "description": "Search query (keywords)"},
-            "top_k": {"type": "integer", "description": "Max results to return", "default": 3}
-        },
-        "required": ["query"],
-        "additionalProperties": False
-    }
-}
-
-tools = [{"type": "function", "function": record_user_details_json},
-        {"type": "function", "function": record_unknown_question_json},
-        {"type": "function", "function": add_common_qa_json},
-        {"type": "function", "function": search_common_qa_json}]
+    pending = _qa_writer().pending()
+    rows = _db().execute("SELECT question, answer, updated_at FROM qa ORDER BY updated_at DESC").fetchall()
+    rows = [(q, a, ts) for q, (a, ts) in pending.items()] + [row for row in rows if row[0] not in pending]
+    rows.sort(key=lambda row: row[2] or 0.0, reverse=True)
+    results = [{"question": q, "answer": a, "updated_at": ts} for (q, a, ts) in rows]
+    return {"results": results, "count": len(results)}
 
+tools = registry.schemas()
 
-class Me:
+
+class _StreamedTurn:
+    """
+    State of one streamed completion: accumulated content, the finish reason,
+    and tool calls reassembled from their streamed fragments (keyed by index).
+    """
 
     def __init__(self):
+        self.content = ""
+        self.finish_reason = None
+        self.usage = None
+        self._calls: Dict[int, dict] = {}
+
+    def feed(self, chunk) -> str:
+        """Consume one stream chunk and return its content delta ("" if none)."""
+        # With include_usage the final chunk carries token usage and no choices
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return ""
+        choice = chunk.choices[0]
+        for delta in choice.delta.tool_calls or []:
+            call = self._calls.setdefault(delta.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function:
+                if delta.function.name:
+                    call["function"]["name"] += delta.function.name
+                if delta.function.arguments:
+                    call["function"]["arguments"] += delta.function.arguments
+        self.finish_reason = choice.finish_reason or self.finish_reason
+        text = choice.delta.content or ""
+        self.content += text
+        return text
+
+    def tool_calls(self) -> List[dict]:
+        return [self._calls[i] for i in sorted(self._calls)]
+
+    def assistant_message(self) -> dict:
+        return {"role": "assistant", "content": self.content or None, "tool_calls": self.tool_calls()}
+
+
+class _TurnUsage:
+    """Prompt-token accounting for one chat turn, summed over its tool-call round trips."""
+
+    def __init__(self, mode: str, messages: List[dict]):
+        self.mode = mode
+        self.estimated_prompt_tokens = count_message_tokens(messages)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self.reported = False
+
+    def add(self, usage):
+        self.calls += 1
+        if usage is not None:
+            self.reported = True
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    def report(self, started: float):
+        billed = f"{self.prompt_tokens} prompt + {self.completion_tokens} completion tokens" if self.reported else "usage not reported"
+        print(f"Turn [{self.mode} prompt]: first prompt ~{self.estimated_prompt_tokens} tokens; "
+              f"{billed} over {self.calls} call(s) in {(time.perf_counter() - started) * 1000:.0f} ms", flush=True)
+
+
+class Me:
+
+    def __init__(self, prompt_mode: str = PROMPT_MODE):
+        if prompt_mode not in PROMPT_MODES:
+            raise ValueError(f"prompt_mode must be one of {PROMPT_MODES}, not {prompt_mode!r}")
+        self.prompt_mode = prompt_mode
         self.openai = OpenAI()
+        self.async_openai = AsyncOpenAI()
+        # self.index is never modified once published: updates are applied to a copy under
+        # _refresh_lock and swapped in, so searches never wait and never see a torn index
+        self._refresh_lock = threading.Lock()
+        # Resend notifications a previous process spooled but never delivered
+        _notifier().start()
         self.name = "Prashant Sharma"
-        reader = PdfReader("me/linkedin.pdf")
-        self.linkedin = ""
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                self.linkedin += text
-        with open("me/summary.txt", "r", encoding="utf-8") as f:
-            self.summary = f.read()
         # SQLite init
         self._init_db()
-        self.qa_pairs, self.qa_last_updated = self._load_qa_from_db()
-        # RAG setup: chunk profile corpus + Q&A and embed once
-        self._rebuild_embeddings()
-
-
-    def handle_tool_call(self, tool_calls):
-        results = []
-        for tool_call in tool_calls:
-            tool_name = tool_call.function.name
-            arguments = json.loads(tool_call.function.arguments)
-            print(f"Tool called: {tool_name}", flush=True)
-            tool = globals().get(tool_name)
-            result = tool(**arguments) if tool else {}
-            results.append({"role": "tool","content": json.dumps(result),"tool_call_id": tool_call.id})
-        return results
+        self.embedding_cache = EmbeddingCache(_db())
+        self.answer_cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_SIZE)
+        self.history = HistoryCompactor(self._summarize_history, HISTORY_KEEP_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_TOKENS)
+        self.embedder = make_backend(EMBEDDING_BACKEND, self.openai, self.async_openai, EMBEDDING_MODEL, LOCAL_EMBEDDING_DIM,
+                                     max_batch_tokens=EMBEDDING_BATCH_TOKENS, concurrency=EMBEDDING_CONCURRENCY,
+                                     requests_per_minute=EMBEDDING_RPM, tokens_per_minute=EMBEDDING_TPM)
+        self.embedding_store = EmbeddingStore(EMBEDDING_STORE_DIR or os.path.join(WARM_START_DIR, f"store-{self.embedder.name}"))
+        # Q&A index entries are built by one leader process and shared through knowledge.db
+        self.versions = VersionWatcher(_db())
+        self.versions.start()
+        self.leader = LeaderLock(leader_lock_path(_db_path()))
+        self.index_version = 0  # newest published index_entries version applied
+        self.qa_version = -1  # 'qa' counter at the last leader check (-1: check on the next refresh)
+        self._pending_generation = -1
+        self._pending_indexed: Dict[str, float] = {}
+        # Warm start: reuse extracted text + index from the last boot if the sources are unchanged
+        snapshot = load_snapshot(WARM_START_DIR, PROFILE_SOURCES, self.embedder.name, len(self.embedding_store))
+        if snapshot:
+            self.linkedin = snapshot["texts"]["linkedin"]
+            self.summary = snapshot["texts"]["summary"]
+            self.index = self._new_index(snapshot["keys"], snapshot["chunks"], snapshot["rows"])
+            self.question_index = self._build_question_index(snapshot["keys"])
+            self.index_version = snapshot["index_version"]
+            stale = self._maybe_refresh_embeddings()
+        else:
+            reader = PdfReader("me/linkedin.pdf")
+            self.linkedin = ""
+            for page in reader.pages:
+                text = page.extract_text()
+                if text:
+                    self.linkedin += text
+            with open("me/summary.txt", "r", encoding="utf-8") as f:
+                self.summary = f.read()
+            # RAG setup: chunk profile corpus + Q&A and embed once
+            self._rebuild_embeddings()
+            stale = True
+        if stale:
+            self._save_warm_start()
+        # From here on Q&A changes are indexed off the request path
+        self.index_refresher = IndexRefresher(self._index_changes, self._maybe_refresh_embeddings,
+                                              INDEX_REFRESH_DEBOUNCE, INDEX_REFRESH_MAX_DELAY)
+        self.index_refresher.start()
+
+
+    def handle_tool_call(self, tool_calls, memo: Optional[TurnMemo] = None):
+        """Run one assistant turn's tool calls (read-only ones in parallel); results keep the call order."""
+        return registry.run(tool_calls, memo)
     
     def system_prompt(self):
+        if self.prompt_mode == "full":
+            source = f"You are given a summary of {self.name}'s background and LinkedIn profile which you can use to answer questions. "
+        else:
+            source = f"You are given excerpts of {self.name}'s summary, LinkedIn profile and earlier answers retrieved for each question; answer from them. "
         system_prompt = f"You are acting as {self.name}. You are answering questions on {self.name}'s website, \
 particularly questions related to {self.name}'s career, background, skills and experience. \
 Your responsibility is to represent {self.name} for interactions on the website as faithfully as possible. \
-You are given a summary of {self.name}'s background and LinkedIn profile which you can use to answer questions. \
+{source}\
 Be professional and engaging, as if talking to a potential client or future employer who came across the website. \
 If you don't know the answer to any question, use your record_unknown_question tool to record the question that you couldn't answer, even if it's about something trivial or unrelated to career. \
 If the user is engaging in discussion, try to steer them towards getting in touch via email; ask for their email and record it using your record_user_details tool. "
 
-        system_prompt += f"\n\n## Summary:\n{self.summary}\n\n## LinkedIn Profile:\n{self.linkedin}\n\n"
+        # Retrieval mode keeps the system prompt a short prefix identical on every turn
+        if self.prompt_mode == "full":
+            system_prompt += f"\n\n## Summary:\n{self.summary}\n\n## LinkedIn Profile:\n{self.linkedin}\n\n"
         system_prompt += f"With this context, please chat with the user, always staying in character as {self.name}."
-        system_prompt += "\n\nAdditionally, you have access to tools to manage a SQLite knowledge base of common questions and answers: use search_common_qa to look up existing answers and add_common_qa to store good answers for future use. IMPORTANT: Always search the knowledge base first when answering questions, and if you provide a comprehensive answer, use add_common_qa to store it for future reference. This helps build a knowledge base of frequently asked questions."
+        system_prompt += "\n\nAdditionally, you have access to tools to manage a SQLite knowledge base of common questions and answers: the best keyword and semantic matches from it are already included in the retrieved context, so only call search_common_qa if that context does not cover the question; use add_common_qa to store good answers for future use. IMPORTANT: If you provide a comprehensive answer, use add_common_qa to store it for future reference. This helps build a knowledge base of frequently asked questions."
         return system_prompt
     
     def chat(self, message, history):
-        # Store the original user message
-        original_user_message = message
-        
-        # Refresh embeddings if DB changed
-        self._maybe_refresh_embeddings()
-        retrieved_context = self._build_rag_context(message)
+        """
+        Stream the reply as it is generated. Yields the accumulated text so
+        gr.ChatInterface can re-render it; tool-call turns are assembled from
+        the stream, executed, and streaming resumes with the follow-up turn.
+        """
+        started = time.perf_counter()
+        # One query embedding serves the semantic cache, RAG and auto-save
+        query_vec = self._embed_query(message)
+        cached_answer, messages = self._prepare_turn(message, history, query_vec)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+        shown = ""
+        first_token = True
+        usage = _TurnUsage(self.prompt_mode, messages)
+        # Read-only tool results are reused for the rest of this turn
+        memo: TurnMemo = {}
+        side_effects = False
+        while True:
+            stream = self.openai.chat.completions.create(model="gpt-4o-mini", messages=messages, tools=tools,
+                                                         stream=True, stream_options={"include_usage": True})
+            turn = _StreamedTurn()
+            for chunk in stream:
+                if turn.feed(chunk):
+                    if first_token:
+                        first_token = False
+                        print(f"Time to first token: {(time.perf_counter() - started) * 1000:.0f} ms", flush=True)
+                    yield shown + turn.content
+            usage.add(turn.usage)
+            if turn.finish_reason != "tool_calls":
+                break
+            messages.append(turn.assistant_message())
+            side_effects = side_effects or registry.has_side_effects(turn.tool_calls())
+            messages.extend(self.handle_tool_call(turn.tool_calls(), memo))
+            if turn.content:
+                shown += turn.content + "\n\n"
+        usage.report(started)
+        self._finish_turn(message, history, shown + turn.content, query_vec, side_effects)
+
+    async def achat(self, message, history):
+        """
+        Async twin of chat() for Gradio's async handlers: completions and the
+        query embedding go through AsyncOpenAI, the tool calls of one assistant
+        turn run with per-tool timeouts (read-only ones concurrently), and blocking SQLite/index
+        work is pushed to worker threads so the event loop never stalls.
+        """
+        started = time.perf_counter()
+        query_vec = await self._aembed_query(message)
+        cached_answer, messages = await asyncio.to_thread(self._prepare_turn, message, history, query_vec)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+        shown = ""
+        first_token = True
+        usage = _TurnUsage(self.prompt_mode, messages)
+        # Read-only tool results are reused for the rest of this turn
+        memo: TurnMemo = {}
+        side_effects = False
+        while True:
+            stream = await self.async_openai.chat.completions.create(model="gpt-4o-mini", messages=messages, tools=tools,
+                                                                     stream=True, stream_options={"include_usage": True})
+            turn = _StreamedTurn()
+            async for chunk in stream:
+                if turn.feed(chunk):
+                    if first_token:
+                        first_token = False
+                        print(f"Time to first token: {(time.perf_counter() - started) * 1000:.0f} ms", flush=True)
+                    yield shown + turn.content
+            usage.add(turn.usage)
+            if turn.finish_reason != "tool_calls":
+                break
+            messages.append(turn.assistant_message())
+            side_effects = side_effects or registry.has_side_effects(turn.tool_calls())
+            messages.extend(await self.ahandle_tool_call(turn.tool_calls(), memo))
+            if turn.content:
+                shown += turn.content + "\n\n"
+        usage.report(started)
+        await asyncio.to_thread(self._finish_turn, message, history, shown + turn.content, query_vec, side_effects)
+
+    async def ahandle_tool_call(self, tool_calls, memo: Optional[TurnMemo] = None):
+        """Async handle_tool_call(): each tool runs in a worker thread, bounded by TOOL_TIMEOUT_SECONDS."""
+        return await registry.arun(tool_calls, memo, TOOL_TIMEOUT_SECONDS)
+
+    def _prepare_turn(self, message, history, query_vec) -> Tuple[Optional[str], List[dict]]:
+        """Return either a cached answer or the messages for the completion loop."""
+        # Cached answers are context-free: a follow-up ("tell me more") always goes to the model
+        cached = self.answer_cache.lookup(query_vec) if not history else None
+        if cached:
+            cached_question, cached_answer, score = cached
+            stats = self.answer_cache.stats()
+            print(f"Semantic cache hit ({score:.3f}) for '{cached_question[:50]}' - hits={stats['hits']} misses={stats['misses']}", flush=True)
+            # Answered without reaching _finish_turn: count the ask against the stored question here
+            record_qa_hit(cached_question)
+            return cached_answer, []
+        if self.prompt_mode == "retrieval":
+            retrieved_context = self._build_rag_context(message, k=RETRIEVAL_TOP_K, query_vec=query_vec,
+                                                        token_budget=RETRIEVAL_TOKEN_BUDGET)
+        else:
+            retrieved_context = self._build_rag_context(message, query_vec=query_vec)
         rag_preamble = "Use the following retrieved context if relevant. If it's not helpful, ignore it.\n\n" + retrieved_context if retrieved_context else ""
-        messages = [{"role": "system", "content": self.system_prompt()}, {"role": "system", "content": rag_preamble}] + history + [{"role": "user", "content": message}]
-        done = False
-        while not done:
-            response = self.openai.chat.completions.create(model="gpt-4o-mini", messages=messages, tools=tools)
-            if response.choices[0].finish_reason=="tool_calls":
-                message = response.choices[0].message
-                tool_calls = message.tool_calls
-                results = self.handle_tool_call(tool_calls)
-                messages.append(message)
-                messages.extend(results)
-            else:
-                done = True
-        
-        # Get the final response content
-        final_response = response.choices[0].message.content
-        
+        messages = [{"role": "system", "content": self.system_prompt()}, {"role": "system", "content": rag_preamble}] + self.history.compact(history) + [{"role": "user", "content": message}]
+        return None, messages
+
+    def _summarize_history(self, previous_summary: str, messages: List[dict]) -> str:
+        """Fold turns that left the verbatim window into the running summary (one small completion)."""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (f"Current summary of the conversation so far:\n{previous_summary or '(none)'}\n\n"
+                  f"New messages:\n{transcript}\n\n"
+                  f"Update the summary to cover the new messages. Keep names, emails, companies, roles and open questions; "
+                  f"stay under {HISTORY_SUMMARY_TOKENS} tokens.")
+        response = self.openai.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "system", "content": f"You maintain a concise running summary of a visitor's chat with {self.name}."},
+                      {"role": "user", "content": prompt}],
+            max_tokens=HISTORY_SUMMARY_TOKENS,
+        )
+        return response.choices[0].message.content or previous_summary
+
+    def _finish_turn(self, message, history, final_response, query_vec, side_effects: bool = False):
+        # A turn that recorded the visitor's details, flagged an unknown question or stored Q&A
+        # itself belongs to this conversation: it is neither auto-saved nor replayed to anyone else
+        if side_effects:
+            return
         # Automatically save Q&A pair if it's a meaningful exchange
         if final_response and len(final_response.strip()) > 10:  # Only save if response is substantial
-            self._auto_save_qa_pair(original_user_message, final_response)
-        
-        return final_response
+            saved = self._auto_save_qa_pair(message, final_response, query_vec)
+            # Only first-turn answers are context-free enough to replay for other visitors, and
+            # what is replayed is the stored Q&A pair the question maps to, not the raw reply
+            if saved is not None and not history:
+                self.answer_cache.put(*saved, query_vec)
 
     # -------------------- RAG utilities --------------------
     def _init_db(self):
-        conn = sqlite3.connect(_db_path())
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS qa (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    question TEXT UNIQUE,
-                    answer TEXT,
-                    updated_at REAL
-                )
-            """)
-            conn.commit()
-        finally:
-            conn.close()
-
-    def _load_qa_from_db(self) -> Tuple[List[Tuple[str, str]], float]:
-        conn = sqlite3.connect(_db_path())
-        try:
-            cur = conn.cursor()
-            cur.execute("SELECT question, answer, updated_at FROM qa ORDER BY updated_at DESC")
-            rows = cur.fetchall()
-            last_updated = 0.0
-            qa_pairs: List[Tuple[str, str]] = []
-            for q, a, ts in rows:
-                qa_pairs.append((q or "", a or ""))
-                if ts and ts > last_updated:
-                    last_updated = ts
-            return qa_pairs, last_updated
-        finally:
-            conn.close()
+        # Opens this thread's connection and runs the one-time schema/FTS migration
+        _db().connection()
 
     def _rebuild_embeddings(self):
-        corpus_items: List[str] = []
-        corpus_items.append(self.summary + "\n\n" + self.linkedin)
-        for q, a in self.qa_pairs:
-            corpus_items.append(f"Q: {q}\nA: {a}")
-        combined_text = "\n\n\n".join(corpus_items)
-        self.corpus_chunks = self._chunk_text(combined_text)
-        self.chunk_embeddings = self._embed_texts(self.corpus_chunks)
-
-    def _maybe_refresh_embeddings(self):
-        conn = sqlite3.connect(_db_path())
-        try:
-            cur = conn.cursor()
-            cur.execute("SELECT COALESCE(MAX(updated_at), 0) FROM qa")
-            row = cur.fetchone()
-            max_updated = row[0] if row and row[0] is not None else 0.0
-        finally:
-            conn.close()
-        if max_updated > (self.qa_last_updated or 0.0):
-            self.qa_pairs, self.qa_last_updated = self._load_qa_from_db()
-            self._rebuild_embeddings()
+        """Full rebuild: profile chunks plus every published Q&A entry, each Q&A pair under its own key."""
+        index = self._new_index()
+        # Chunked per document so no chunk straddles the summary and the PDF
+        profile_chunks = dedupe_chunks(chunk_profile(self.summary) + chunk_profile(self.linkedin))
+        if profile_chunks:
+            vectors = normalize_rows(self._embed_texts(profile_chunks))
+            for i, (chunk, vec) in enumerate(zip(profile_chunks, vectors)):
+                index.add(("profile", i), [chunk], vec[None, :], [content_hash(chunk)])
+        with self._refresh_lock:
+            self.index = index
+            self.question_index = self._build_question_index([])
+            self.index_version = 0
+            self.qa_version = -1
+            self._pending_generation = -1
+            self._pending_indexed = {}
+        self._maybe_refresh_embeddings()
+
+    def _new_index(self, keys=(), chunks=(), rows=(), questions: bool = False) -> VectorIndex:
+        """Index over the shared embedding store, exact or IVF per RETRIEVAL_INDEX."""
+        if RETRIEVAL_INDEX != "ivf":
+            return VectorIndex.from_rows(list(keys), list(chunks), list(rows), self.embedding_store)
+        index = IVFIndex.from_rows(list(keys), list(chunks), list(rows), self.embedding_store,
+                                   nprobe=IVF_NPROBE, min_train=IVF_MIN_TRAIN)
+        index.load(_ann_path(self.embedder.name, questions))
+        return index
+
+    def _build_question_index(self, keys) -> VectorIndex:
+        """
+        Index of question-only embeddings for the Q&A keys in `keys`, used to
+        spot near-duplicate questions (the RAG index holds whole Q: ... A: ...
+        chunks). Exact or IVF like the RAG index: it is searched on every saved turn.
+        """
+        questions = list(dict.fromkeys(key[1] for key in keys if key[0] == "qa"))
+        return self._new_index([("qa", q) for q in questions], questions, self._question_rows(questions), questions=True)
+
+    def _question_rows(self, questions: List[str]) -> List[int]:
+        """Embedding-store rows of question-only vectors, embedding the ones the store lacks."""
+        hashes = [content_hash(q) for q in questions]
+        missing = [q for q, h in zip(questions, hashes) if self.embedding_store.row_of(h) is None]
+        if missing:
+            self.embedding_store.append([content_hash(q) for q in missing], normalize_rows(self._embed_texts(missing)))
+        return [self.embedding_store.row_of(h) for h in hashes]
+
+    def _index_changes(self) -> Optional[Tuple[int, int, int]]:
+        """Counters of changes the index has not caught up with, or None when fresh; memory only, no I/O."""
+        changes = (self.versions.get("index"), self.versions.get("qa"), _qa_writer().generation)
+        if changes[0] <= self.index_version and changes[1] <= self.qa_version and changes[2] == self._pending_generation:
+            return None
+        return changes
 
-    def _chunk_text(self, text: str, max_chars: int = 800, overlap: int = 100) -> List[str]:
-        text = (text or "").strip()
-        if not text:
+    def _maybe_refresh_embeddings(self) -> bool:
+        """
+        Bring the index up to date with entries published by the leader process
+        and with this process's own write-behind Q&A rows. Runs on the
+        IndexRefresher thread after startup; chat turns never wait for it.
+        """
+        if self._index_changes() is None:
+            return False
+        writer = _qa_writer()
+        with self._refresh_lock:
+            qa_version = self.versions.get("qa")
+            if qa_version > self.qa_version and self.leader.acquire():
+                self._publish_qa_delta()
+            self.qa_version = qa_version
+            changed = self._apply_published()
+            return self._apply_pending(writer) or changed
+
+    def _publish_qa_delta(self):
+        """Leader only: embed Q&A rows changed since the published mark and publish their entries."""
+        _, mark = read_mark(_db())
+        changes, last_seq = qa_changes_since(_db(), mark)
+        if changes:
+            entries = self._embed_qa_pairs({q: a for q, a in changes.items() if a is not None})
+            entries += [(("qa", q), None, [], None) for q, a in changes.items() if a is None]
+            publish(_db(), self.embedder.name, entries, last_seq)
+
+    def _apply_published(self) -> bool:
+        """Apply index entries published since self.index_version; returns whether any were applied."""
+        # Versions the watcher has seen were committed before this read, so none are skipped
+        seen = self.versions.get("index")
+        entries, latest = entries_since(_db(), self.embedder.name, self.index_version)
+        self.index_version = max(latest, seen)
+        if not entries:
+            return False
+        self.embedding_store.refresh()
+        store_rows = len(self.embedding_store)
+        usable = [e for e in entries if not e[2] or max(e[2]) < store_rows]
+        if len(usable) < len(entries):
+            # Entries point past the embedding store (it was deleted or replaced): have them republished
+            print(f"{len(entries) - len(usable)} published index entries point past the embedding store", flush=True)
+            if self.leader.acquire():
+                relog_all_qa(_db())
+                self.qa_version = -1
+        self._apply_entries(usable)
+        return True
+
+    def _apply_pending(self, writer: QAWriteBuffer) -> bool:
+        """Index this process's write-behind Q&A rows before they are committed and published."""
+        self._pending_generation = writer.generation
+        pending = writer.pending()
+        fresh = {q: a for q, (a, ts) in pending.items() if self._pending_indexed.get(q) != ts}
+        self._pending_indexed = {q: ts for q, (_, ts) in pending.items()}
+        if not fresh:
+            return False
+        self._apply_entries(self._embed_qa_pairs(fresh))
+        return True
+
+    def _embed_qa_pairs(self, qa_pairs: Dict[str, str]) -> List[Entry]:
+        """Chunk and embed Q&A pairs into the shared embedding store: one index entry per question."""
+        if not qa_pairs:
             return []
-        chunks: List[str] = []
-        start = 0
-        while start < len(text):
-            end = min(len(text), start + max_chars)
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            if end == len(text):
-                break
-            start = end - overlap
-            if start < 0:
-                start = 0
-        return chunks
+        # Each pair's chunks, then its question alone for the question index (see _question_rows)
+        texts_by_question = {q: qa_embedding_texts(q, a) for q, a in qa_pairs.items()}
+        texts = [t for pair_texts in texts_by_question.values() for t in pair_texts]
+        vectors = normalize_rows(self._embed_texts(texts))
+        rows = self.embedding_store.append([content_hash(t) for t in texts], vectors)
+        entries: List[Entry] = []
+        offset = 0
+        for question, pair_texts in texts_by_question.items():
+            chunks = pair_texts[:-1]
+            entries.append((("qa", question), chunks, rows[offset:offset + len(chunks)].tolist(), qa_pairs[question]))
+            offset += len(pair_texts)
+        return entries
+
+    def _apply_entries(self, entries: List[Entry]):
+        """
+        Patch entries into a copy of the index and publish it. A replaced answer
+        tombstones its old chunks instead of triggering a full rebuild.
+        """
+        previous, previous_questions = self.index, self.question_index
+        index, question_index = previous.copy(), previous_questions.copy()
+        added = [key[1] for key, chunks, _, _ in entries if key[0] == "qa" and chunks is not None]
+        question_rows = dict(zip(added, self._question_rows(added)))
+        for key, chunks, rows, _ in entries:
+            if chunks is None:
+                index.remove(key)
+                question_index.remove(key)
+            else:
+                index.add_rows(key, chunks, rows)
+                if key[0] == "qa":
+                    question_index.add_rows(key, [key[1]], [question_rows[key[1]]])
+        self.index, self.question_index = index, question_index
+        for updated, before, questions in ((index, previous, False), (question_index, previous_questions, True)):
+            if isinstance(updated, IVFIndex) and updated.centroids is not before.centroids:
+                # (Re)trained by these entries: persist the quantizer so a restart neither retrains nor reassigns
+                self._save_quantizer(updated, questions)
+        for key, chunks, _, answer in entries:
+            if key[0] == "qa":
+                # A rewritten or deleted answer must not keep being served from the answer cache
+                self.answer_cache.invalidate(key[1], answer)
+
+    def _save_warm_start(self):
+        with self._refresh_lock:
+            # The index and the version it reflects, read together
+            index, question_index, index_version = self.index, self.question_index, self.index_version
+        try:
+            keys, chunks, rows = index.entry_arrays()
+            save_snapshot(WARM_START_DIR, PROFILE_SOURCES, self.embedder.name,
+                          {"linkedin": self.linkedin, "summary": self.summary},
+                          keys, chunks, rows.tolist(), index_version)
+        except OSError as e:
+            print(f"Could not write warm-start snapshot: {e}", flush=True)
+        for saved, questions in ((index, False), (question_index, True)):
+            if isinstance(saved, IVFIndex):
+                self._save_quantizer(saved, questions)
+
+    def _save_quantizer(self, index: IVFIndex, questions: bool = False):
+        try:
+            index.save(_ann_path(self.embedder.name, questions))
+        except OSError as e:
+            print(f"Could not write IVF quantizer: {e}", flush=True)
 
-    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+    def _embed_texts(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """
+        Embed texts, reusing vectors already in the embedding store (or, for
+        chunks embedded before the store existed, in knowledge.db) so only
+        never-seen chunks hit the embeddings API. Returns a float32 matrix in input order.
+        """
         if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        hashes = [content_hash(t) for t in texts]
+        cached: Dict[str, np.ndarray] = {}
+        if use_cache:
+            stored = [h for h in dict.fromkeys(hashes) if self.embedding_store.row_of(h) is not None]
+            if stored:
+                cached.update(zip(stored, self.embedding_store.take([self.embedding_store.row_of(h) for h in stored])))
+            cached.update(self.embedding_cache.get_many(self.embedder.name, [h for h in hashes if h not in cached]))
+        missing = list(dict.fromkeys(h for h in hashes if h not in cached))
+        if missing:
+            text_by_hash = dict(zip(hashes, texts))
+            fresh = self._embed_uncached([text_by_hash[h] for h in missing])
+            cached.update(zip(missing, fresh))
+            if use_cache:
+                # Not written to knowledge.db: callers append them to the embedding store, which persists them
+                print(f"Embedded {len(missing)} new chunk(s) with {self.embedder.name}, {len(texts) - len(missing)} from cache", flush=True)
+        return np.vstack([cached[h] for h in hashes])
+
+    def _embed_uncached(self, texts: List[str]) -> List[np.ndarray]:
+        return list(self.embedder.embed(texts))
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Normalized query embedding (not persisted in the embedding cache)."""
+        q_emb = self._embed_texts([query], use_cache=False)
+        if len(q_emb) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return normalize_vector(q_emb[0])
+
+    async def _aembed_query(self, query: str) -> np.ndarray:
+        q_emb = await self.embedder.aembed([query])
+        if len(q_emb) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return normalize_vector(q_emb[0])
+
+    def _similarity_search(self, query: str, k: int = 4, query_vec: Optional[np.ndarray] = None) -> List[Tuple[float, Hashable, str]]:
+        """Vector leg: best k chunks as (score, document key, chunk)."""
+        index = self.index  # one snapshot for the search and the position lookups
+        if len(index) == 0:
             return []
-        # Batch embeddings to keep within token limits
-        model = "text-embedding-3-small"
-        embeddings: List[List[float]] = []
-        batch_size = 64
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i+batch_size]
-            resp = self.openai.embeddings.create(model=model, input=batch)
-            embeddings.extend([d.embedding for d in resp.data])
-        return embeddings
-
-    def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        if not a or not b or len(a) != len(b):
-            return 0.0
-        dot = 0.0
-        norm_a = 0.0
-        norm_b = 0.0
-        for x, y in zip(a, b):
-            dot += x * y
-            norm_a += x * x
-            norm_b += y * y
-        if norm_a == 0.0 or norm_b == 0.0:
-            return 0.0
-        return dot / (math.sqrt(norm_a) * math.sqrt(norm_b))
-
-    def _similarity_search(self, query: str, k: int = 4) -> List[Tuple[float, str]]:
-        if not self.corpus_chunks:
-            return []
-        q_emb = self._embed_texts([query])
-        if not q_emb:
-            return []
-        q = q_emb[0]
-        scored: List[Tuple[float, str]] = []
-        for emb, chunk in zip(self.chunk_embeddings, self.corpus_chunks):
-            scored.append((self._cosine_similarity(q, emb), chunk))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return scored[:k]
-
-    def _build_rag_context(self, query: str, k: int = 4) -> str:
-        top = self._similarity_search(query, k=k)
+        q = query_vec if query_vec is not None else self._embed_query(query)
+        return [(score, index.keys[row], index.chunks[row]) for score, row in index.search(q, k)]
+
+    def _hybrid_search(self, query: str, k: int = 4, candidates: int = 10, query_vec: Optional[np.ndarray] = None) -> List[Tuple[float, List[str], str]]:
+        """
+        Fuse the vector ranking over profile + Q&A chunks with the BM25 ranking
+        over Q&A rows using reciprocal rank fusion, keyed by source document.
+        Returns (fused score, contributing retrievers, text) best first.
+        """
+        texts: Dict[Hashable, str] = {}
+        vector_keys: List[Hashable] = []
+        for _, key, chunk in self._similarity_search(query, k=candidates, query_vec=query_vec):
+            # A document's best chunk represents it
+            if key not in texts:
+                texts[key] = chunk
+                vector_keys.append(key)
+        keyword_keys: List[Hashable] = []
+        for q, a, _, _ in _search_qa_rows(query, top_k=candidates):
+            key = ("qa", q)
+            texts.setdefault(key, f"Q: {q}\nA: {a}")
+            keyword_keys.append(key)
+        fused = reciprocal_rank_fusion([vector_keys, keyword_keys])
+        vector_set, keyword_set = set(vector_keys), set(keyword_keys)
+        results = []
+        for key, score in fused[:k]:
+            sources = [name for name, keys in (("vector", vector_set), ("keyword", keyword_set)) if key in keys]
+            results.append((score, sources, texts[key]))
+        return results
+
+    def _build_rag_context(self, query: str, k: int = 4, query_vec: Optional[np.ndarray] = None,
+                           token_budget: Optional[int] = None) -> str:
+        """Format the top-k hits; with a token budget, hits that no longer fit are skipped."""
+        top = self._hybrid_search(query, k=k, query_vec=query_vec)
         if not top:
             return ""
         lines = []
-        for score, chunk in top:
-            lines.append(f"[score={score:.3f}]\n{chunk}")
+        used = 0
+        for score, sources, text in top:
+            entry = f"[rrf={score:.4f} via {'+'.join(sources)}]\n{text}"
+            if token_budget is not None:
+                tokens = count_tokens(entry)
+                if used + tokens > token_budget:
+                    continue
+                used += tokens
+            lines.append(entry)
         return "\n\n---\n\n".join(lines)
-    
-    def _auto_save_qa_pair(self, question: str, answer: str):
+
+    def _find_duplicate_question(self, question: str, query_vec: Optional[np.ndarray]) -> Optional[str]:
+        """Stored question the new one repeats exactly or paraphrases (question-to-question similarity)."""
+        # An exact repeat must never overwrite the stored (often curated) answer
+        if get_qa_answer(question) is not None:
+            return question
+        if query_vec is None or not len(query_vec):
+            return None
+        index = self.question_index
+        hits = index.search(query_vec, k=1)
+        if hits and hits[0][0] >= QA_DUPLICATE_THRESHOLD:
+            return index.keys[hits[0][1]][1]
+        return None
+
+    def _auto_save_qa_pair(self, question: str, answer: str, query_vec: Optional[np.ndarray] = None) -> Optional[Tuple[str, str]]:
         """
-        Automatically save Q&A pairs to the database with some filtering logic
+        Automatically save Q&A pairs to the database with some filtering logic.
+        Returns the stored (question, answer) the exchange maps to, if any.
         """
         # Skip saving if question is too short or seems like a greeting
         question = question.strip()
@@ -388,17 +771,19 @@ If the user is engaging in discussion, try to steer them towards getting in touc
         if len(answer) < 20:
             return
         
-        # Check if this Q&A pair already exists (simple check)
-        existing = search_common_qa(question[:50])  # Search with first 50 chars
-        if existing.get('results'):
-            # If similar question exists, don't duplicate
-            return
+        # A paraphrase of a stored question bumps its hit count instead of adding a row
+        duplicate = self._find_duplicate_question(question, query_vec)
+        if duplicate is not None:
+            record_qa_hit(duplicate)
+            print(f"Near-duplicate of stored Q&A '{duplicate[:50]}'; hit count bumped")
+            stored_answer = get_qa_answer(duplicate)
+            return (duplicate, stored_answer) if stored_answer else None
         
         try:
             # Save the Q&A pair
-            result = add_common_qa(question, answer)
+            add_common_qa(question, answer)
             print(f"Auto-saved Q&A pair: {question[:50]}... -> {answer[:50]}...")
-            return result
+            return question, answer
         except Exception as e:
             print(f"Error auto-saving Q&A pair: {e}")
             return None
@@ -408,7 +793,7 @@ If the user is engaging in discussion, try to steer them towards getting in touc
 def create_interface():
     me = Me()
     return gr.ChatInterface(
-        me.chat, 
+        me.achat,
         title="💼 Career Conversation AI",
         description="Upload your resume and get personalized career advice!",
         examples=[
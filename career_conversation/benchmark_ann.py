@@ -0,0 +1,84 @@
+"""
+Recall@k versus latency of the IVF index (ann_index.IVFIndex) against exact
+search (retrieval.VectorIndex) over the same vectors.
+
+Synthetic embeddings are drawn around a few hundred topic centres, which is
+closer to real text-embedding structure than uniform noise (on uniform noise
+no partitioning can beat a full scan). Queries are perturbed corpus rows.
+
+Usage:
+    python benchmark_ann.py
+    python benchmark_ann.py --sizes 10000 50000 --nprobe 1 4 8 16 32 --queries 200
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from ann_index import IVFIndex
+from retrieval import VectorIndex, normalize_rows, normalize_vector
+
+
+DIM = 1536  # text-embedding-3-small
+
+
+def synthetic_corpus(n: int, topics: int, rng: np.random.Generator) -> np.ndarray:
+    centres = normalize_rows(rng.standard_normal((topics, DIM), dtype=np.float32))
+    labels = rng.integers(0, topics, n)
+    noise = rng.standard_normal((n, DIM), dtype=np.float32) * (1.2 / np.sqrt(DIM))
+    return normalize_rows(centres[labels] + noise)
+
+
+def timed_search(index: VectorIndex, queries: np.ndarray, k: int):
+    results = []
+    t0 = time.perf_counter()
+    for q in queries:
+        results.append([pos for _, pos in index.search(q, k)])
+    return (time.perf_counter() - t0) * 1000 / len(queries), results
+
+
+def run(sizes: List[int], nprobes: List[int], queries: int, k: int, topics: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for n in sizes:
+        matrix = synthetic_corpus(n, topics, rng)
+        keys = [("qa", i) for i in range(n)]
+        chunks = [str(i) for i in range(n)]
+        picks = rng.choice(n, queries, replace=False)
+        query_matrix = normalize_rows(matrix[picks] + rng.standard_normal((queries, DIM), dtype=np.float32) * (0.5 / np.sqrt(DIM)))
+        query_list = [normalize_vector(q) for q in query_matrix]
+
+        exact = VectorIndex.from_arrays(keys, chunks, matrix)
+        exact_ms, truth = timed_search(exact, query_list, k)
+
+        ivf = IVFIndex.from_arrays(keys, chunks, matrix, min_train=1)
+        t0 = time.perf_counter()
+        ivf.train()
+        train_s = time.perf_counter() - t0
+        nlist = ivf.centroids.shape[0]
+        print(f"\n{n} chunks, {nlist} lists (trained in {train_s:.1f} s); exact search {exact_ms:.2f} ms/query")
+        print(f"{'nprobe':>6} | {'scanned':>8} | {'ms/query':>8} | {'speedup':>7} | recall@{k}")
+        print("-" * 50)
+        for nprobe in nprobes:
+            ivf.nprobe = min(nprobe, nlist)
+            ivf_ms, found = timed_search(ivf, query_list, k)
+            recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)])
+            scanned = ivf.nprobe / nlist
+            print(f"{ivf.nprobe:>6} | {scanned:>7.1%} | {ivf_ms:>8.2f} | {exact_ms / ivf_ms:>6.1f}x | {recall:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.nprobe, args.queries, args.k, args.topics, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Compare the legacy fixed-window chunker with the structure-preserving one in
+chunking.py on the real corpus (me/summary.txt, me/linkedin.pdf and the Q&A
+rows in knowledge.db): chunk count, embedded tokens, Q&A pairs split across
+chunks, and tokens injected into the prompt per top-k retrieval.
+
+Retrieval is simulated offline with a lexical score (shared non-stopword
+terms, length-normalized) over a fixed question set, keeping the best chunk
+per document as Me._hybrid_search does, so no embeddings API key is needed.
+
+Usage:
+    python benchmark_chunking.py
+    python benchmark_chunking.py --db knowledge.db -k 4 --max-tokens 160
+"""
+
+import argparse
+import math
+import re
+import sqlite3
+from typing import Hashable, List, Set, Tuple
+
+from pypdf import PdfReader
+
+from chunking import PROFILE_CHUNK_TOKENS, chunk_profile, chunk_qa, dedupe_chunks
+from knowledge_db import FTS_STOPWORDS
+from tokens import count_tokens
+
+
+PROFILE_QUESTIONS = [
+    "What AWS certifications do you have?",
+    "Where are you based?",
+    "What is your experience with Kubernetes and Docker?",
+    "What food do you like?",
+    "Tell me about your cloud migration projects",
+    "What did you work on at your last company?",
+]
+
+
+def legacy_chunk_text(text: str, max_chars: int = 800, overlap: int = 100) -> List[str]:
+    """The 800-char/100-overlap window Me._chunk_text used before chunking.py."""
+    text = (text or "").strip()
+    if not text:
+        return []
+    chunks: List[str] = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + max_chars)
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end == len(text):
+            break
+        start = end - overlap
+        if start < 0:
+            start = 0
+    return chunks
+
+
+def load_corpus(db_path: str) -> Tuple[str, str, List[Tuple[str, str]]]:
+    linkedin = "".join(page.extract_text() or "" for page in PdfReader("me/linkedin.pdf").pages)
+    with open("me/summary.txt", "r", encoding="utf-8") as f:
+        summary = f.read()
+    try:
+        conn = sqlite3.connect(db_path)
+        qa_pairs = conn.execute("SELECT question, answer FROM qa").fetchall()
+        conn.close()
+    except sqlite3.Error:
+        qa_pairs = []
+    return summary, linkedin, qa_pairs
+
+
+def _terms(text: str) -> Set[str]:
+    return {t for t in re.findall(r"\w+", text.lower()) if t not in FTS_STOPWORDS}
+
+
+def tokens_per_retrieval(entries: List[Tuple[Hashable, str]], queries: List[str], k: int) -> float:
+    """Mean prompt tokens of the top-k chunks (best chunk per document key) over `queries`."""
+    chunk_terms = [_terms(chunk) for _, chunk in entries]
+    total = 0
+    for query in queries:
+        q = _terms(query)
+        ranked = sorted(range(len(entries)), key=lambda i: -len(q & chunk_terms[i]) / math.sqrt(len(chunk_terms[i]) + 1))
+        seen = set()
+        for i in ranked:
+            key, chunk = entries[i]
+            if key in seen:
+                continue
+            seen.add(key)
+            total += count_tokens(chunk)
+            if len(seen) == k:
+                break
+    return total / len(queries)
+
+
+def report(name: str, entries: List[Tuple[Hashable, str]], split_pairs: int, queries: List[str], k: int):
+    chunks = [chunk for _, chunk in entries]
+    tokens = [count_tokens(c) for c in chunks]
+    total = sum(tokens)
+    mean = total / len(tokens) if tokens else 0.0
+    per_retrieval = tokens_per_retrieval(entries, queries, k)
+    print(f"{name:>8} | {len(chunks):>6} | {total:>13} | {mean:>10.1f} | {max(tokens, default=0):>6} | "
+          f"{split_pairs:>11} | {per_retrieval:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="knowledge.db")
+    parser.add_argument("-k", type=int, default=4, help="chunks retrieved per question")
+    parser.add_argument("--max-tokens", type=int, default=PROFILE_CHUNK_TOKENS, help="profile chunk budget for the new chunker")
+    args = parser.parse_args()
+
+    summary, linkedin, qa_pairs = load_corpus(args.db)
+
+    queries = [q for q, _ in qa_pairs] + PROFILE_QUESTIONS
+
+    legacy = [(("profile", i), c) for i, c in enumerate(legacy_chunk_text(summary + "\n\n" + linkedin))]
+    legacy_split = 0
+    for q, a in qa_pairs:
+        pieces = legacy_chunk_text(f"Q: {q}\nA: {a}")
+        legacy.extend((("qa", q), p) for p in pieces)
+        legacy_split += len(pieces) > 1
+
+    profile = dedupe_chunks(chunk_profile(summary, args.max_tokens) + chunk_profile(linkedin, args.max_tokens))
+    new = [(("profile", i), c) for i, c in enumerate(profile)]
+    for q, a in qa_pairs:
+        new.extend((("qa", q), c) for c in chunk_qa(q, a))
+
+    print(f"{len(qa_pairs)} Q&A pairs, {len(queries)} questions, top-{args.k} retrieval")
+    print(f"{'chunker':>8} | {'chunks':>6} | {'tokens total':>13} | {'mean/chunk':>10} | {'max':>6} | "
+          f"{'split pairs':>11} | {'tokens/query':>12}")
+    print("-" * 84)
+    report("legacy", legacy, legacy_split, queries, args.k)
+    report("new", new, 0, queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
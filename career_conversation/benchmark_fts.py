@@ -0,0 +1,98 @@
+"""
+Latency of keyword search (KnowledgeDB.search_qa) against exhaustive BM25
+over the same knowledge.db, with top-k overlap between the two.
+
+The synthetic Q&A rows draw words from a Zipfian vocabulary, as real text
+does: a few words ("aws", "cloud", "experience") appear in most rows, which
+is the case where ranking on every query term means scanning most of the
+table. Queries mix common-only, rare-only and mixed terms.
+
+Usage:
+    python benchmark_fts.py
+    python benchmark_fts.py --sizes 10000 100000 --repeat 50
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from knowledge_db import KnowledgeDB, fts_query, fts_terms
+
+
+COMMON_WORDS = ["aws", "cloud", "experience", "team", "work", "project", "kubernetes", "devops", "python", "terraform"]
+
+QUERIES = [
+    "aws",
+    "Tell me about your AWS cloud experience",
+    "kubernetes w4000",
+    "w300 w900",
+    "w15000",
+    "python terraform devops project",
+]
+
+
+def synthetic_rows(n: int, vocab_size: int, rng: np.random.Generator):
+    vocab = COMMON_WORDS + [f"w{i}" for i in range(len(COMMON_WORDS), vocab_size)]
+    p = 1.0 / np.arange(1, vocab_size + 1) ** 1.07
+    p /= p.sum()
+    questions = rng.choice(vocab_size, size=(n, 8), p=p)
+    answers = rng.choice(vocab_size, size=(n, 50), p=p)
+    for i in range(n):
+        yield (" ".join(vocab[j] for j in questions[i]) + f" q{i}?",
+               " ".join(vocab[j] for j in answers[i]), float(i))
+
+
+def exhaustive(db: KnowledgeDB, query: str, k: int) -> List[str]:
+    """Every non-stopword term ranked by bm25(): the pre-pruning search."""
+    rows = db.execute("""
+        SELECT qa.question FROM (SELECT rowid, rank FROM qa_fts WHERE qa_fts MATCH ? ORDER BY rank LIMIT ?) AS m
+        JOIN qa ON qa.id = m.rowid ORDER BY m.rank
+    """, (fts_query(fts_terms(query)), k)).fetchall()
+    return [q for (q,) in rows]
+
+
+def timed(fn, repeat: int):
+    result = fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / repeat, result
+
+
+def run(sizes: List[int], vocab_size: int, k: int, repeat: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = KnowledgeDB(os.path.join(tmp, "knowledge.db"))
+            t0 = time.perf_counter()
+            with db.transaction() as cur:
+                cur.executemany("INSERT INTO qa (question, answer, updated_at) VALUES (?, ?, ?)",
+                                synthetic_rows(n, vocab_size, rng))
+            print(f"\n{n} Q&A rows (built in {time.perf_counter() - t0:.1f} s)")
+            print(f"{'query':<42} | {'exhaustive':>10} | {'search_qa':>9} | {'speedup':>7} | overlap@{k}")
+            print("-" * 90)
+            for query in QUERIES:
+                exact_ms, truth = timed(lambda: exhaustive(db, query, k), max(1, repeat // 10))
+                search_ms, found = timed(lambda: [q for q, _, _, _ in db.search_qa(query, k)], repeat)
+                overlap = len(set(found) & set(truth)) / max(1, len(truth))
+                print(f"{query:<42} | {exact_ms:>7.2f} ms | {search_ms:>6.3f} ms | {exact_ms / search_ms:>6.0f}x | {overlap:.2f}")
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--vocab", type=int, default=20_000)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.vocab, args.k, args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
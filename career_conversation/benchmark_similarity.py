@@ -0,0 +1,95 @@
+"""
+Benchmark the RAG similarity search: legacy pure-Python cosine loop vs the
+pre-normalized NumPy matrix + argpartition path used by Me._similarity_search.
+
+Usage:
+    python benchmark_similarity.py
+    python benchmark_similarity.py --sizes 1000 10000 --queries 20
+"""
+
+import argparse
+import math
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from retrieval import normalize_rows, normalize_vector, top_k_cosine
+
+
+DIM = 1536  # text-embedding-3-small
+LEGACY_BLOCK = 2000  # rows materialized as Python lists at a time (keeps memory bounded at 100k)
+
+
+def legacy_cosine_similarity(a: List[float], b: List[float]) -> float:
+    """The per-chunk scoring loop Me used before the NumPy index."""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    dot = 0.0
+    norm_a = 0.0
+    norm_b = 0.0
+    for x, y in zip(a, b):
+        dot += x * y
+        norm_a += x * x
+        norm_b += y * y
+    if norm_a == 0.0 or norm_b == 0.0:
+        return 0.0
+    return dot / (math.sqrt(norm_a) * math.sqrt(norm_b))
+
+
+def legacy_search(raw: np.ndarray, query: List[float], k: int) -> Tuple[float, List[Tuple[float, int]]]:
+    """Time the legacy path; rows are converted to lists outside the timed region."""
+    elapsed = 0.0
+    scored: List[Tuple[float, int]] = []
+    for start in range(0, raw.shape[0], LEGACY_BLOCK):
+        block = raw[start:start + LEGACY_BLOCK].tolist()
+        t0 = time.perf_counter()
+        for offset, emb in enumerate(block):
+            scored.append((legacy_cosine_similarity(query, emb), start + offset))
+        elapsed += time.perf_counter() - t0
+    t0 = time.perf_counter()
+    scored.sort(key=lambda x: x[0], reverse=True)
+    top = scored[:k]
+    elapsed += time.perf_counter() - t0
+    return elapsed, top
+
+
+def run(sizes: List[int], queries: int, legacy_queries: int, k: int, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    print(f"{'chunks':>8} | {'legacy ms/query':>16} | {'numpy ms/query':>15} | {'speedup':>8} | top-k match")
+    print("-" * 70)
+    for n in sizes:
+        raw = rng.standard_normal((n, DIM), dtype=np.float32)
+        matrix = normalize_rows(raw)
+        query_raw = rng.standard_normal(DIM, dtype=np.float32)
+        query = normalize_vector(query_raw)
+
+        top_k_cosine(matrix, query, k)  # warm-up
+        t0 = time.perf_counter()
+        for _ in range(queries):
+            fast = top_k_cosine(matrix, query, k)
+        numpy_ms = (time.perf_counter() - t0) * 1000 / queries
+
+        legacy_total = 0.0
+        for _ in range(legacy_queries):
+            elapsed, slow = legacy_search(raw, query_raw.tolist(), k)
+            legacy_total += elapsed
+        legacy_ms = legacy_total * 1000 / legacy_queries
+
+        match = [i for i, _ in fast] == [i for _, i in slow]
+        print(f"{n:>8} | {legacy_ms:>16.1f} | {numpy_ms:>15.3f} | {legacy_ms / numpy_ms:>7.0f}x | {match}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=50, help="queries timed on the NumPy path")
+    parser.add_argument("--legacy-queries", type=int, default=1, help="queries timed on the legacy path")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.legacy_queries, args.k, args.seed)
+
+
+if __name__ == "__main__":
+    main()
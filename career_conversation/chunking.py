@@ -0,0 +1,100 @@
+"""
+Structure-preserving chunker for the RAG index.
+
+Profile text is split on paragraph boundaries first, then sentences, then
+lines, and only a run-on piece that still exceeds the budget is cut on token
+boundaries. Pieces are packed greedily up to `max_tokens` without overlap, so
+no text is embedded or retrieved twice, and identical chunks are dropped. Each Q&A pair is always one chunk.
+"""
+
+import re
+from typing import Iterable, List
+
+from tokens import count_tokens, split_tokens, truncate_tokens
+
+PROFILE_CHUNK_TOKENS = 128  # smaller, focused chunks keep top-k prompt context lean
+EMBEDDING_MAX_TOKENS = 8191  # text-embedding-3-* input limit
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _split_paragraph(paragraph: str, max_tokens: int) -> List[str]:
+    """Sentences (or lines, or token windows) of an over-budget paragraph."""
+    pieces: List[str] = []
+    for sentence in _SENTENCE_END.split(paragraph):
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        for line in sentence.splitlines():
+            line = line.strip()
+            if line:
+                pieces.extend([line] if count_tokens(line) <= max_tokens else split_tokens(line, max_tokens))
+    return pieces
+
+
+def chunk_profile(text: str, max_tokens: int = PROFILE_CHUNK_TOKENS) -> List[str]:
+    """
+    Pack paragraphs of `text` into chunks of at most `max_tokens` tokens. Short
+    paragraphs share a chunk; a paragraph over the budget gets chunks of its own,
+    packed from its sentences, so identical paragraphs always chunk identically.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+        current, current_tokens = [], 0
+
+    def pack(piece: str, tokens: int):
+        nonlocal current_tokens
+        # +1 for the joining newline
+        if current and current_tokens + 1 + tokens > max_tokens:
+            flush()
+        current_tokens += tokens + (1 if current else 0)
+        current.append(piece)
+
+    for paragraph in _PARAGRAPH_BREAK.split((text or "").strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            pack(paragraph, tokens)
+            continue
+        flush()
+        for piece in _split_paragraph(paragraph, max_tokens):
+            pack(piece, count_tokens(piece))
+        flush()
+    flush()
+    return dedupe_chunks(chunks)
+
+
+def chunk_qa(question: str, answer: str) -> List[str]:
+    """A Q&A pair is retrieved whole, never split (only capped at the embedding input limit)."""
+    text = f"Q: {(question or '').strip()}\nA: {(answer or '').strip()}"
+    return [truncate_tokens(text, EMBEDDING_MAX_TOKENS)]
+
+
+def qa_embedding_texts(question: str, answer: str) -> List[str]:
+    """
+    Every text embedded for a Q&A pair: its chunks, then the question on its
+    own (for the duplicate-question index). app.py and ingest_qa.py both embed
+    exactly these, so a bulk load leaves the app nothing to embed.
+    """
+    return chunk_qa(question, answer) + [question]
+
+
+def dedupe_chunks(chunks: Iterable[str]) -> List[str]:
+    """Drop chunks identical to an earlier one, ignoring whitespace differences."""
+    seen = set()
+    unique: List[str] = []
+    for chunk in chunks:
+        normalized = " ".join(chunk.split())
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            unique.append(chunk)
+    return unique
@@ -0,0 +1,15 @@
+"""
+Shared pytest fixtures for the career_conversation tests.
+"""
+
+import pytest
+
+from retrieval import normalize_rows
+
+
+@pytest.fixture
+def unit_vectors():
+    """unit_vectors(rng, n, dim=8): n random unit-length rows."""
+    def make(rng, n, dim=8):
+        return normalize_rows(rng.standard_normal((n, dim)))
+    return make
@@ -0,0 +1,241 @@
+"""
+Embedding backends for the RAG index.
+
+Me talks to one EmbeddingBackend for every vector it needs: profile and Q&A
+chunks, and the query of each chat turn. Backends differ in where the work
+happens:
+
+* OpenAIBackend calls the embeddings API (text-embedding-3-small by default).
+  Texts are packed into batches by token count, batches are sent
+  concurrently within requests/tokens-per-minute budgets (rate_limit.py),
+  and 429 responses are retried with jittered exponential backoff.
+* HashingBackend runs locally on the CPU with NumPy and never touches the
+  network: words, word bigrams and character trigrams are hashed into a
+  fixed number of signed buckets with sublinear term-frequency weights.
+  There is no fitted vocabulary or IDF table, so a text always maps to the
+  same vector and cached vectors stay valid as the corpus grows; stopwords
+  are dropped instead of being down-weighted by IDF.
+
+Vectors from different backends live in different spaces. `name` keys the
+embedding cache, the embedding store and the published index entries, so
+switching a corpus from one backend to another never mixes the two.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from knowledge_db import FTS_STOPWORDS
+from rate_limit import RateLimiter
+from tokens import count_tokens
+
+BACKENDS = ("openai", "local")
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+
+class EmbeddingBackend:
+    """Turns texts into float32 vectors (not necessarily normalized)."""
+
+    name = ""
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    async def aembed(self, texts: Sequence[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed, texts)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds a 429 response asked us to wait, if it said."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _without_retries(client):
+    with_options = getattr(client, "with_options", None)
+    return with_options(max_retries=0) if with_options else client
+
+
+class OpenAIBackend(EmbeddingBackend):
+
+    def __init__(self, client, async_client=None, model: str = "text-embedding-3-small",
+                 max_batch_tokens: int = 100_000, max_batch_items: int = 2048, concurrency: int = 4,
+                 requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_retries: int = 6, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        # 429s are retried here, with the limiter in the loop, rather than by the client
+        self.client = _without_retries(client)
+        self.async_client = _without_retries(async_client)
+        self.name = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        started = time.perf_counter()
+        requests, retries = self.requests, self.retries
+        batches = self._batches(texts)
+        if len(batches) == 1:
+            results = [self._embed_batch(*batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches)),
+                                    thread_name_prefix="embed-batch") as pool:
+                results = list(pool.map(lambda batch: self._embed_batch(*batch), batches))
+        if len(texts) > 1:
+            elapsed = time.perf_counter() - started
+            tokens = sum(n for _, n in batches)
+            print(f"Embedded {len(texts)} text(s), {tokens} tokens in {elapsed:.2f}s "
+                  f"({tokens / max(elapsed, 1e-9):.0f} tokens/s, {len(texts) / max(elapsed, 1e-9):.1f} texts/s; "
+                  f"{self.requests - requests} request(s), {self.retries - retries} retried)", flush=True)
+        return np.vstack(results)
+
+    async def aembed(self, texts: Sequence[str]) -> np.ndarray:
+        if self.async_client is None:
+            return await super().aembed(texts)
+        texts = list(texts)
+        tokens = sum(count_tokens(t) for t in texts)
+        attempt = 0
+        while True:
+            wait = self.limiter.reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._count(requests=1)
+            try:
+                resp = await self.async_client.embeddings.create(model=self.name, input=texts)
+                break
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(e, attempt))
+                attempt += 1
+        if not resp.data:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([np.asarray(d.embedding, dtype=np.float32) for d in resp.data])
+
+    def _batches(self, texts: List[str]) -> List[tuple]:
+        """Consecutive (texts, token count) batches within the token and item caps."""
+        batches: List[tuple] = []
+        current: List[str] = []
+        current_tokens = 0
+        for text in texts:
+            tokens = count_tokens(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_items):
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    def _embed_batch(self, batch: List[str], tokens: int) -> np.ndarray:
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            self._count(requests=1)
+            try:
+                resp = self.client.embeddings.create(model=self.name, input=batch)
+                return np.vstack([np.asarray(d.embedding, dtype=np.float32) for d in resp.data])
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(e, attempt))
+                attempt += 1
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        """Only rate-limit (429) errors are retried, at most max_retries times."""
+        if getattr(error, "status_code", None) != 429 or attempt >= self.max_retries:
+            return False
+        self._count(retries=1)
+        return True
+
+    def _count(self, requests: int = 0, retries: int = 0):
+        with self._stats_lock:
+            self.requests += requests
+            self.retries += retries
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        # Full jitter keeps concurrent batches from retrying in lockstep
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, _retry_after(error) or 0.0)
+
+
+class HashingBackend(EmbeddingBackend):
+
+    def __init__(self, dim: int = 1024, char_ngram: int = 3, char_weight: float = 0.5):
+        self.dim = dim
+        self.char_ngram = char_ngram
+        self.char_weight = char_weight
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            features, counts, n_terms = self._features(text)
+            if not features:
+                continue
+            weights = 1.0 + np.log(counts)
+            weights[n_terms:] *= self.char_weight
+            hashes = np.fromiter((_crc32(f) for f in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+            np.add.at(matrix[i], hashes % self.dim, signs * weights)
+        return matrix
+
+    def _features(self, text: str) -> Tuple[List[str], np.ndarray, int]:
+        """Features of a text, their counts, and how many leading features are terms (not char n-grams)."""
+        words = [w for w in _WORD.findall((text or "").lower()) if w not in FTS_STOPWORDS]
+        word_counts: "Counter[str]" = Counter(words)
+        terms: "Counter[str]" = Counter(word_counts)
+        terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        grams: "Counter[str]" = Counter()
+        for word, c in word_counts.items():
+            for gram in _char_grams(word, self.char_ngram):
+                grams[gram] += c
+        features = list(terms) + list(grams)
+        counts = np.fromiter(chain(terms.values(), grams.values()), dtype=np.float32, count=len(features))
+        return features, counts, len(terms)
+
+
+@lru_cache(maxsize=1 << 16)
+def _char_grams(word: str, n: int) -> Tuple[str, ...]:
+    padded = f"<{word}>"
+    return tuple(f"#{padded[j:j + n]}" for j in range(max(1, len(padded) - n + 1)))
+
+
+@lru_cache(maxsize=1 << 18)
+def _crc32(feature: str) -> int:
+    # crc32 rather than hash(): Python salts str hashes per process
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+def make_backend(kind: str, client=None, async_client=None, model: str = "text-embedding-3-small",
+                 dim: int = 1024, **openai_options) -> EmbeddingBackend:
+    """Backend for EMBEDDING_BACKEND: "openai" (remote) or "local" (offline hashing)."""
+    if kind == "openai":
+        return OpenAIBackend(client, async_client, model, **openai_options)
+    if kind == "local":
+        return HashingBackend(dim)
+    raise ValueError(f"embedding backend must be one of {BACKENDS}, not {kind!r}")
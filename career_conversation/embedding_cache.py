@@ -0,0 +1,46 @@
+"""
+Legacy embedding cache stored in knowledge.db.
+
+Vectors are keyed by (model, sha256(text)). New vectors are written only to
+the shared embedding store (embedding_store.py) under the same content
+hashes, so this table is read-only: it is consulted as a fallback for chunks
+embedded before the store existed, which saves re-embedding them on upgrade.
+"""
+
+import hashlib
+from typing import Dict, Iterable
+
+import numpy as np
+
+from knowledge_db import KnowledgeDB
+
+
+_LOOKUP_BATCH = 500  # stay well under SQLite's bound-parameter limit
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+
+    def __init__(self, db: KnowledgeDB):
+        # The embeddings table is part of the knowledge.db schema (see knowledge_db.SCHEMA_SQL)
+        self.db = db
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return the cached float32 vectors for whichever of `hashes` are present."""
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, np.ndarray] = {}
+        for i in range(0, len(wanted), _LOOKUP_BATCH):
+            batch = wanted[i:i + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.db.execute(
+                f"SELECT content_hash, dim, vector FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                [model, *batch],
+            ).fetchall()
+            for h, dim, blob in rows:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                if vec.shape[0] == dim:
+                    found[h] = vec
+        return found
@@ -0,0 +1,167 @@
+"""
+Append-only, memory-mapped float16 embedding store.
+
+Vectors live in one raw float16 file (`vectors.f16`, row-major) and
+`manifest.jsonl` maps row numbers to chunk IDs (content hashes), one JSON line
+per row. Every process opens the file with np.memmap read-only, so all Gradio
+workers share a single copy through the OS page cache instead of each holding
+~6 KB of boxed floats per chunk.
+
+Appends write new rows past the end of the data file, fsync it, and only then
+append their manifest lines, so a reader never sees a manifest row whose
+vector is missing. A chunk ID that is already stored is never written twice,
+and existing rows are never rewritten. Writers serialize on an flock'd lock
+file where available (POSIX); elsewhere only threads of one process are
+serialized.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+DTYPE = np.float16
+SCORE_BLOCK_ROWS = 16384  # rows upcast to float32 at a time while scoring
+
+
+class EmbeddingStore:
+
+    # Rows are stable and shared between processes: index compaction keeps row numbers
+    shared = True
+
+    def __init__(self, directory: str, dim: Optional[int] = None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._data_path = os.path.join(directory, "vectors.f16")
+        self._manifest_path = os.path.join(directory, "manifest.jsonl")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._lock_path = os.path.join(directory, "lock")
+        self._thread_lock = threading.RLock()
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._manifest_offset = 0
+        self._mm: Optional[np.memmap] = None
+        self._mapped_rows = 0
+        self.dim = dim
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                stored_dim = json.load(f)["dim"]
+            if dim is not None and dim != stored_dim:
+                raise ValueError(f"store at {directory} holds {stored_dim}-d vectors, not {dim}-d")
+            self.dim = stored_dim
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        return self._row_of.get(chunk_id)
+
+    def refresh(self):
+        """Pick up rows other processes appended since the last look (reads only the new manifest tail)."""
+        with self._thread_lock:
+            try:
+                with open(self._manifest_path, "rb") as f:
+                    f.seek(self._manifest_offset)
+                    tail = f.read()
+            except FileNotFoundError:
+                return
+            # Ignore a trailing partial line; it is re-read once complete
+            complete = tail[:tail.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                row, chunk_id = json.loads(line)
+                if row != len(self._ids):
+                    raise ValueError(f"corrupt embedding store manifest at row {row}")
+                self._row_of.setdefault(chunk_id, row)
+                self._ids.append(chunk_id)
+            self._manifest_offset += len(complete)
+            if self.dim is None and os.path.exists(self._meta_path):
+                with open(self._meta_path, "r", encoding="utf-8") as f:
+                    self.dim = json.load(f)["dim"]
+
+    def append(self, chunk_ids: Sequence[str], vectors: np.ndarray) -> np.ndarray:
+        """Store vectors for chunk IDs not seen before; returns the row of every ID in order."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._locked():
+            self.refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim, "dtype": "float16"}, f)
+            elif len(chunk_ids) and vectors.shape[1] != self.dim:
+                raise ValueError(f"expected {self.dim}-d vectors, got {vectors.shape[1]}-d")
+            new_ids: List[str] = []
+            new_rows: List[int] = []
+            seen = set()
+            for i, chunk_id in enumerate(chunk_ids):
+                if chunk_id not in self._row_of and chunk_id not in seen:
+                    seen.add(chunk_id)
+                    new_ids.append(chunk_id)
+                    new_rows.append(i)
+            if new_ids:
+                row_bytes = self.dim * np.dtype(DTYPE).itemsize
+                start = len(self._ids)
+                with open(self._data_path, "ab+") as f:
+                    # Drop bytes of an append that crashed before reaching the manifest
+                    f.truncate(start * row_bytes)
+                    f.seek(start * row_bytes)
+                    f.write(vectors[new_rows].astype(DTYPE).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self._manifest_path, "a", encoding="utf-8") as f:
+                    for offset, chunk_id in enumerate(new_ids):
+                        f.write(json.dumps([start + offset, chunk_id]) + "\n")
+                self.refresh()
+            return np.array([self._row_of[c] for c in chunk_ids], dtype=np.int64)
+
+    def matrix(self) -> np.ndarray:
+        """Read-only float16 memmap of every stored row (remapped when the store has grown)."""
+        with self._thread_lock:
+            n = len(self._ids)
+            if self._mm is None or self._mapped_rows != n:
+                if n == 0 or self.dim is None:
+                    return np.zeros((0, self.dim or 0), dtype=DTYPE)
+                self._mm = np.memmap(self._data_path, dtype=DTYPE, mode="r", shape=(n, self.dim))
+                self._mapped_rows = n
+            return self._mm
+
+    def scores(self, query: np.ndarray, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Dot products of a float32 query with the given rows (every row by
+        default), upcasting one block at a time. Only the pages of the rows
+        asked for are read, however many stale rows the store has accumulated.
+        """
+        matrix = self.matrix()
+        n = matrix.shape[0] if rows is None else len(rows)
+        out = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SCORE_BLOCK_ROWS):
+            if rows is None:
+                block = matrix[start:start + SCORE_BLOCK_ROWS]
+            else:
+                block = matrix[np.asarray(rows[start:start + SCORE_BLOCK_ROWS], dtype=np.int64)]
+            out[start:start + block.shape[0]] = block.astype(np.float32) @ query
+        return out
+
+    def take(self, rows: Sequence[int]) -> np.ndarray:
+        return self.matrix()[np.asarray(rows, dtype=np.int64)].astype(np.float32)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
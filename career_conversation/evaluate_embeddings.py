@@ -0,0 +1,112 @@
+"""
+Retrieval quality and latency of each embedding backend (embedding_backends.py)
+on the real corpus: profile chunks from me/summary.txt and me/linkedin.pdf plus
+the Q&A rows in knowledge.db, chunked exactly as Me does.
+
+Every labeled question names a marker text; a retrieved chunk containing the
+marker is relevant. Reported per backend: hit@k and MRR over the questions,
+time to embed the corpus, per-query embedding latency (p50/p95, the network
+round trip for the remote backend) and search time.
+
+The remote backend only runs when OPENAI_API_KEY is set.
+
+Usage:
+    python evaluate_embeddings.py
+    python evaluate_embeddings.py --backends local --dim 512 2048 -k 4
+"""
+
+import argparse
+import os
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from benchmark_chunking import load_corpus
+from chunking import chunk_profile, chunk_qa, dedupe_chunks
+from embedding_backends import EmbeddingBackend, HashingBackend, OpenAIBackend
+from retrieval import normalize_rows, normalize_vector, top_k_scores
+
+
+# (question, text a relevant chunk contains); phrased unlike the corpus on purpose
+LABELED_QUESTIONS = [
+    ("Which AWS certifications have you earned?", "AWS Certified Security"),
+    ("Where are you living these days?", "Bengaluru"),
+    ("Where did you grow up?", "Delhi"),
+    ("Is there any food you can't stand?", "mushrooms"),
+    ("What is your current job?", "Senior DevOps and Cloud Engineer"),
+    ("How do you speed up software releases?", "CI/CD"),
+    ("How can I reach you by email?", "gmail.com"),
+    ("Have you worked on mapping or geospatial projects?", "GIS"),
+    ("What is your educational background?", "Master of Computer Applications"),
+    ("Have you invented anything?", "patents"),
+    ("How long have you been working in tech?", "years of experience"),
+]
+
+
+def build_chunks(db_path: str) -> List[str]:
+    summary, linkedin, qa_pairs = load_corpus(db_path)
+    chunks = dedupe_chunks(chunk_profile(summary) + chunk_profile(linkedin))
+    for q, a in qa_pairs:
+        chunks.extend(chunk_qa(q, a))
+    return chunks
+
+
+def evaluate(backend: EmbeddingBackend, chunks: List[str], questions: List[Tuple[str, str]], k: int):
+    started = time.perf_counter()
+    matrix = normalize_rows(backend.embed(chunks))
+    corpus_seconds = time.perf_counter() - started
+
+    embed_ms: List[float] = []
+    search_ms: List[float] = []
+    hits = 0
+    reciprocal_ranks = 0.0
+    for question, marker in questions:
+        started = time.perf_counter()
+        query = normalize_vector(backend.embed([question])[0])
+        embedded = time.perf_counter()
+        top = top_k_scores(matrix @ query, k)
+        finished = time.perf_counter()
+        embed_ms.append((embedded - started) * 1000)
+        search_ms.append((finished - embedded) * 1000)
+        for rank, i in enumerate(top, 1):
+            if marker.lower() in chunks[i].lower():
+                hits += 1
+                reciprocal_ranks += 1.0 / rank
+                break
+
+    n = len(questions)
+    print(f"{backend.name:>22} | {hits / n:>5.2f} | {reciprocal_ranks / n:>5.2f} | {corpus_seconds * 1000:>9.1f} | "
+          f"{np.percentile(embed_ms, 50):>9.2f} | {np.percentile(embed_ms, 95):>9.2f} | {np.mean(search_ms):>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="knowledge.db")
+    parser.add_argument("-k", type=int, default=4, help="chunks retrieved per question")
+    parser.add_argument("--backends", nargs="+", default=["local", "openai"], choices=["local", "openai"])
+    parser.add_argument("--dim", type=int, nargs="+", default=[256, 1024, 4096], help="local hashing dimensions")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.db)
+    backends: List[EmbeddingBackend] = []
+    if "local" in args.backends:
+        backends.extend(HashingBackend(dim) for dim in args.dim)
+    if "openai" in args.backends:
+        if os.getenv("OPENAI_API_KEY"):
+            from openai import OpenAI
+            backends.append(OpenAIBackend(OpenAI(), model=args.model))
+        else:
+            print("OPENAI_API_KEY not set: skipping the openai backend")
+
+    print(f"{len(chunks)} chunks, {len(LABELED_QUESTIONS)} labeled questions, top-{args.k} retrieval")
+    print(f"{'backend':>22} | {'hit@k':>5} | {'MRR':>5} | {'corpus ms':>9} | {'query p50':>9} | "
+          f"{'query p95':>9} | {'search ms':>9}")
+    print("-" * 92)
+    for backend in backends:
+        evaluate(backend, chunks, LABELED_QUESTIONS, args.k)
+
+
+if __name__ == "__main__":
+    main()
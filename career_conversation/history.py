@@ -0,0 +1,115 @@
+"""
+Conversation history compaction.
+
+Gradio resends the whole chat history on every turn. HistoryCompactor keeps
+the last few turns verbatim and folds everything older into a rolling
+summary. Summaries are cached under a hash chain of the folded turns, so each
+session's summary is extended with only the turns that fell out of the
+verbatim window since the last message, never regenerated from scratch. The
+result is held to a hard token budget.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List
+
+from tokens import count_message_tokens, count_tokens, truncate_tokens
+
+# summarize(previous summary or "", newly folded messages) -> updated summary
+Summarizer = Callable[[str, List[dict]], str]
+
+
+def split_turns(history: List[dict]) -> List[List[dict]]:
+    """Group messages into turns: a user message plus the replies that follow it."""
+    turns: List[List[dict]] = []
+    for message in history:
+        content = message.get("content") or ""
+        message = {"role": message.get("role"), "content": content if isinstance(content, str) else str(content)}
+        if message["role"] == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def _chain(previous: str, turn: List[dict]) -> str:
+    digest = hashlib.sha256(previous.encode("utf-8"))
+    for message in turn:
+        digest.update(b"\0" + str(message["role"]).encode("utf-8") + b"\0" + str(message["content"]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class HistoryCompactor:
+
+    def __init__(self, summarize: Summarizer, keep_turns: int = 4, token_budget: int = 3000,
+                 summary_tokens: int = 300, max_sessions: int = 1024):
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.max_sessions = max_sessions
+        # chain hash of the folded turns -> summary of exactly those turns
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compact(self, history: List[dict]) -> List[dict]:
+        """Messages to send in place of `history`: optional summary message plus the recent turns."""
+        turns = split_turns(history)
+        folded = max(0, len(turns) - self.keep_turns)
+        while True:
+            summary = self._summary_for(turns[:folded])
+            messages = self._summary_messages(summary) + [m for turn in turns[folded:] for m in turn]
+            # Over budget: fold the oldest verbatim turn too, keeping at least the last one
+            if count_message_tokens(messages) <= self.token_budget or folded >= len(turns) - 1:
+                break
+            folded += 1
+        return self._truncate(messages)
+
+    def _summary_messages(self, summary: str) -> List[dict]:
+        if not summary:
+            return []
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}]
+
+    def _summary_for(self, turns: List[List[dict]]) -> str:
+        if not turns:
+            return ""
+        hashes: List[str] = []
+        h = ""
+        for turn in turns:
+            h = _chain(h, turn)
+            hashes.append(h)
+        # Longest already-summarized prefix of this session's folded turns
+        start, summary = 0, ""
+        with self._lock:
+            for i in range(len(hashes) - 1, -1, -1):
+                if hashes[i] in self._summaries:
+                    start, summary = i + 1, self._summaries[hashes[i]]
+                    self._summaries.move_to_end(hashes[i])
+                    break
+        if start == len(turns):
+            return summary
+        new_messages = [m for turn in turns[start:] for m in turn]
+        try:
+            summary = truncate_tokens(self.summarize(summary, new_messages).strip(), self.summary_tokens)
+        except Exception as e:
+            # Keep serving the previous summary; the unfolded turns are retried next time
+            print(f"History summarization failed: {e}", flush=True)
+            return summary
+        with self._lock:
+            self._summaries[hashes[-1]] = summary
+            while len(self._summaries) > self.max_sessions:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def _truncate(self, messages: List[dict]) -> List[dict]:
+        """Last resort for a single oversized turn: trim message contents, oldest first."""
+        messages = [dict(m) for m in messages]
+        excess = count_message_tokens(messages) - self.token_budget
+        for message in messages:
+            if excess <= 0:
+                break
+            tokens = count_tokens(message["content"])
+            message["content"] = truncate_tokens(message["content"], max(0, tokens - excess))
+            excess -= tokens - count_tokens(message["content"])
+        return messages
@@ -0,0 +1,101 @@
+"""
+Background maintenance of the RAG index.
+
+chat() used to refresh the index itself, so the first visitor after a Q&A
+write paid for chunking and embedding it. IndexRefresher moves that to a
+worker thread: it polls a cheap, in-memory staleness signature, waits until
+writes have been quiet for `debounce` seconds (or `max_delay` has passed
+since the first change) so a burst of writes costs one refresh, then runs
+the refresh, which builds and publishes a new index snapshot. Requests keep
+searching the previous snapshot meanwhile.
+
+stats() reports refresh durations and staleness lag: the time from the first
+poll that saw a change to the moment the refreshed snapshot was published.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+
+class IndexRefresher:
+
+    def __init__(self, changes: Callable[[], Optional[Hashable]], refresh: Callable[[], bool],
+                 debounce: float = 0.5, max_delay: float = 5.0, poll_interval: float = 0.25):
+        # changes() -> None while the index is fresh, else a value that changes with every new write; no I/O
+        self.changes = changes
+        self.refresh = refresh
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stale_since: Optional[float] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_seconds = 0.0
+        self.max_refresh_seconds = 0.0
+        self.last_staleness_seconds = 0.0
+        self.max_staleness_seconds = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def stats(self) -> Dict[str, float]:
+        stale_since = self._stale_since
+        return {
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_refresh_seconds": round(self.last_refresh_seconds, 4),
+            "max_refresh_seconds": round(self.max_refresh_seconds, 4),
+            "last_staleness_seconds": round(self.last_staleness_seconds, 4),
+            "max_staleness_seconds": round(self.max_staleness_seconds, 4),
+            # How long the index being served right now has been behind (0 when fresh)
+            "stale_for_seconds": round(time.time() - stale_since, 4) if stale_since is not None else 0.0,
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            signature = self.changes()
+            if signature is None:
+                continue
+            quiet_since = time.time()
+            # After a failed refresh the lag keeps counting from the first change
+            first_seen = self._stale_since if self._stale_since is not None else quiet_since
+            self._stale_since = first_seen
+            # Debounce: let a burst of writes settle, but never past max_delay
+            while not self._stop.is_set():
+                now = time.time()
+                if now - quiet_since >= self.debounce or now - first_seen >= self.max_delay:
+                    break
+                self._stop.wait(min(self.poll_interval, self.debounce - (now - quiet_since)))
+                current = self.changes()
+                if current != signature:
+                    signature, quiet_since = current, time.time()
+            if self._stop.is_set():
+                return
+            started = time.time()
+            try:
+                changed = self.refresh()
+            except Exception as e:
+                # The snapshot being served stays in place; the next poll retries
+                self.failures += 1
+                print(f"Background index refresh failed: {e}", flush=True)
+                continue
+            finished = time.time()
+            self._stale_since = None
+            self.refreshes += 1
+            self.last_refresh_seconds = finished - started
+            self.max_refresh_seconds = max(self.max_refresh_seconds, self.last_refresh_seconds)
+            self.last_staleness_seconds = finished - first_seen
+            self.max_staleness_seconds = max(self.max_staleness_seconds, self.last_staleness_seconds)
+            if changed:
+                print(f"Index refreshed in {self.last_refresh_seconds * 1000:.0f} ms; "
+                      f"staleness lag {self.last_staleness_seconds * 1000:.0f} ms", flush=True)
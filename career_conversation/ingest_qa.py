@@ -0,0 +1,186 @@
+"""
+Bulk-load curated Q&A pairs into knowledge.db without running the app.
+
+Input is streamed from CSV (a header with question and answer columns) or
+JSONL (one {"question": ..., "answer": ...} object per line), so memory stays
+flat however large the file is. Rows are upserted in large transactions (the
+same upsert add_common_qa uses); the FTS5 keyword index is kept in step by
+the qa triggers inside each transaction, so BM25 search sees a batch as soon
+as it commits.
+
+Embeddings are precomputed in the same pass: each pair is split into the
+texts the app embeds for it (its chunks and the question alone), texts not
+already in the shared embedding store (or the older embedding cache in
+knowledge.db) are embedded in concurrent, rate-limited batches, and the
+vectors go to the store. Embedding of the next batch overlaps the database
+write of the previous one. When the app next refreshes its index, the leader
+process publishes the new rows without a single embeddings API call.
+
+Usage:
+    python ingest_qa.py answers.csv
+    python ingest_qa.py answers.jsonl --backend local --batch-size 5000
+    python ingest_qa.py answers.csv --keep-existing --no-embed
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from chunking import qa_embedding_texts
+from embedding_backends import BACKENDS, EmbeddingBackend, make_backend
+from embedding_cache import EmbeddingCache, content_hash
+from embedding_store import EmbeddingStore
+from knowledge_db import KnowledgeDB
+from qa_writer import UPSERT_SQL
+from retrieval import normalize_rows
+
+INSERT_NEW_SQL = "INSERT INTO qa (question, answer, updated_at) VALUES (?, ?, ?) ON CONFLICT(question) DO NOTHING"
+WARM_START_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_start")
+
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """Stream (question, answer) pairs from a CSV or JSONL file (format from the extension by default)."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield (row.get("question") or "").strip(), (row.get("answer") or "").strip()
+        else:
+            for line in f:
+                if line.strip():
+                    obj = json.loads(line)
+                    yield str(obj.get("question") or "").strip(), str(obj.get("answer") or "").strip()
+
+
+def _batches(rows: Iterator[Tuple[str, str]], size: int, stats: Dict[str, int]) -> Iterator[Dict[str, str]]:
+    """Batches of up to `size` distinct questions; later rows of a question win."""
+    batch: Dict[str, str] = {}
+    for question, answer in rows:
+        stats["read"] += 1
+        if not question or not answer:
+            stats["skipped"] += 1
+            continue
+        batch.pop(question, None)
+        batch[question] = answer
+        if len(batch) >= size:
+            yield batch
+            batch = {}
+    if batch:
+        yield batch
+
+
+def _drop_existing(db: KnowledgeDB, batch: Dict[str, str]) -> Dict[str, str]:
+    """The batch without questions already in the database (looked up a few hundred at a time)."""
+    questions = list(batch)
+    existing = set()
+    for start in range(0, len(questions), 500):
+        chunk = questions[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        existing.update(q for (q,) in db.execute(f"SELECT question FROM qa WHERE question IN ({placeholders})", chunk))
+    return {q: a for q, a in batch.items() if q not in existing}
+
+
+def _precompute_embeddings(batch: Dict[str, str], backend: EmbeddingBackend, cache: EmbeddingCache,
+                           store: EmbeddingStore) -> int:
+    """Add the batch's texts missing from the store to it; returns how many had to be embedded."""
+    chunks = list(dict.fromkeys(t for q, a in batch.items() for t in qa_embedding_texts(q, a)))
+    # Rows the store already holds are skipped by content hash
+    new = [(c, content_hash(c)) for c in chunks if store.row_of(content_hash(c)) is None]
+    if not new:
+        return 0
+    # Chunks embedded before the store existed are still in knowledge.db
+    cached = cache.get_many(backend.name, [h for _, h in new])
+    missing = [(c, h) for c, h in new if h not in cached]
+    if missing:
+        cached.update(zip([h for _, h in missing], backend.embed([c for c, _ in missing])))
+    store.append([h for _, h in new], normalize_rows([cached[h] for _, h in new]))
+    return len(missing)
+
+
+def ingest(db: KnowledgeDB, rows: Iterator[Tuple[str, str]], batch_size: int = 2000, keep_existing: bool = False,
+           backend: Optional[EmbeddingBackend] = None, store: Optional[EmbeddingStore] = None) -> Dict[str, float]:
+    """Upsert `rows` in transactions of `batch_size` questions, precomputing embeddings when a backend is given."""
+    stats: Dict[str, float] = {"read": 0, "skipped": 0, "existing": 0, "written": 0, "embedded": 0, "transactions": 0}
+    sql = INSERT_NEW_SQL if keep_existing else UPSERT_SQL
+    cache = EmbeddingCache(db) if backend is not None else None
+    started = time.perf_counter()
+
+    def write(batch: Dict[str, str]):
+        now_ts = time.time()
+        with db.transaction() as cur:
+            cur.executemany(sql, [(q, a, now_ts) for q, a in batch.items()])
+        stats["written"] += len(batch)
+        stats["transactions"] += 1
+        elapsed = time.perf_counter() - started
+        print(f"{int(stats['written'])} rows written ({stats['written'] / elapsed:.0f} rows/s)", flush=True)
+
+    # One writer thread: committing batch i overlaps embedding batch i + 1
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="qa-ingest-writer") as writer:
+        pending: Optional[Future] = None
+        for batch in _batches(rows, batch_size, stats):
+            if keep_existing:
+                # Questions left untouched need no embeddings either
+                new = _drop_existing(db, batch)
+                stats["existing"] += len(batch) - len(new)
+                batch = new
+                if not batch:
+                    continue
+            if backend is not None:
+                stats["embedded"] += _precompute_embeddings(batch, backend, cache, store)
+            if pending is not None:
+                pending.result()
+            pending = writer.submit(write, batch)
+        if pending is not None:
+            pending.result()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["written"] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+def main():
+    # Before the parser: .env values feed its defaults
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or JSONL file of question/answer pairs")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input format (default: from the extension)")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge.db"))
+    parser.add_argument("--batch-size", type=int, default=2000, help="questions per transaction")
+    parser.add_argument("--keep-existing", action="store_true", help="leave questions already in the database untouched")
+    parser.add_argument("--no-embed", action="store_true", help="only load rows; the app embeds them on its next refresh")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.getenv("EMBEDDING_BACKEND", "openai"))
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--dim", type=int, default=int(os.getenv("LOCAL_EMBEDDING_DIM", "1024")), help="local backend dimension")
+    parser.add_argument("--store-dir", help="embedding store directory (default: warm_start/store-<backend name>)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("EMBEDDING_CONCURRENCY", "4")))
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("EMBEDDING_RPM", "3000")))
+    parser.add_argument("--tpm", type=float, default=float(os.getenv("EMBEDDING_TPM", "1000000")))
+    args = parser.parse_args()
+
+    backend = store = None
+    if not args.no_embed:
+        if args.backend == "openai":
+            from openai import OpenAI
+            backend = make_backend("openai", OpenAI(), model=args.model, concurrency=args.concurrency,
+                                   requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+        else:
+            backend = make_backend(args.backend, dim=args.dim)
+        store = EmbeddingStore(args.store_dir or os.path.join(WARM_START_DIR, f"store-{backend.name}"))
+
+    db = KnowledgeDB(args.db)
+    try:
+        stats = ingest(db, read_rows(args.path, args.format), args.batch_size, args.keep_existing, backend, store)
+    finally:
+        db.close()
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Connection manager and schema for knowledge.db.
+
+Each thread gets one long-lived connection (Gradio serves chat turns from a
+worker thread pool), opened in WAL mode with tuned PRAGMAs so readers never
+block the writer. The schema, including the FTS5 index migration, is created
+once per process per database file instead of on every call. Connections keep
+a statement cache, so the same SQL text reuses its compiled statement.
+"""
+
+import atexit
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS qa (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT UNIQUE,
+        answer TEXT,
+        updated_at REAL,
+        hit_count INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS qa_updated_at ON qa(updated_at)",
+    """
+    CREATE TABLE IF NOT EXISTS embeddings (
+        model TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        dim INTEGER NOT NULL,
+        vector BLOB NOT NULL,
+        created_at REAL,
+        PRIMARY KEY (model, content_hash)
+    ) WITHOUT ROWID
+    """,
+    # Monotonic change counters: 'qa' is bumped by triggers on every Q&A content change,
+    # 'index' each time a process publishes index entries (mark = last qa_changes.seq covered)
+    """
+    CREATE TABLE IF NOT EXISTS versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        mark INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO versions (name) VALUES ('qa'), ('index')",
+    "CREATE TRIGGER IF NOT EXISTS qa_version_ai AFTER INSERT ON qa BEGIN UPDATE versions SET version = version + 1 WHERE name = 'qa'; END",
+    "CREATE TRIGGER IF NOT EXISTS qa_version_ad AFTER DELETE ON qa BEGIN UPDATE versions SET version = version + 1 WHERE name = 'qa'; END",
+    "CREATE TRIGGER IF NOT EXISTS qa_version_au AFTER UPDATE OF question, answer ON qa BEGIN UPDATE versions SET version = version + 1 WHERE name = 'qa'; END",
+    # Q&A change log in commit order: writers are serialized, so a later commit always gets a larger
+    # seq, whatever updated_at it carries (write-behind rows are stamped when queued, not when committed).
+    # AUTOINCREMENT keeps seq from being reused once published rows are pruned.
+    "CREATE TABLE IF NOT EXISTS qa_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL)",
+    "CREATE TRIGGER IF NOT EXISTS qa_changes_ai AFTER INSERT ON qa BEGIN INSERT INTO qa_changes (question) VALUES (new.question); END",
+    "CREATE TRIGGER IF NOT EXISTS qa_changes_ad AFTER DELETE ON qa BEGIN INSERT INTO qa_changes (question) VALUES (old.question); END",
+    """CREATE TRIGGER IF NOT EXISTS qa_changes_au AFTER UPDATE OF question, answer ON qa BEGIN
+        INSERT INTO qa_changes (question) SELECT old.question WHERE old.question IS NOT new.question;
+        INSERT INTO qa_changes (question) VALUES (new.question);
+    END""",
+    # Shared RAG index: one row per indexed document, pointing at embedding-store rows
+    """
+    CREATE TABLE IF NOT EXISTS index_entries (
+        model TEXT NOT NULL,
+        doc_key TEXT NOT NULL,
+        chunks TEXT,
+        store_rows TEXT,
+        answer TEXT,
+        version INTEGER NOT NULL,
+        PRIMARY KEY (model, doc_key)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS index_entries_version ON index_entries(model, version)",
+]
+
+# External-content FTS5 index over qa, kept in sync by triggers. The update
+# trigger only fires on question/answer changes so bookkeeping columns (updated_at,
+# hit_count) don't reindex.
+QA_FTS_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS qa_fts USING fts5(question, answer, content='qa', content_rowid='id', tokenize='porter unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS qa_fts_ai AFTER INSERT ON qa BEGIN
+        INSERT INTO qa_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS qa_fts_ad AFTER DELETE ON qa BEGIN
+        INSERT INTO qa_fts(qa_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS qa_fts_au AFTER UPDATE OF question, answer ON qa BEGIN
+        INSERT INTO qa_fts(qa_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+        INSERT INTO qa_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+    # Default rank = BM25 with question matches weighted twice as much as answer matches
+    "INSERT INTO qa_fts(qa_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0)')",
+]
+
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # WAL stays consistent; only the last commits may roll back on power loss
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",  # 16 MB page cache per connection
+    "PRAGMA mmap_size = 134217728",
+]
+
+STATEMENT_CACHE_SIZE = 256
+
+# Words that match most rows and only slow BM25 down without changing the ranking much
+FTS_STOPWORDS = {
+    "a", "an", "and", "are", "about", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "have", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "that", "the", "this",
+    "to", "was", "what", "when", "where", "which", "who", "why", "with", "you", "your",
+}
+
+
+# bm25() counts every row matching each query term, so ranking on a term costs a scan of
+# all its rows. Terms are ranked on only while their rows add up to this many; more common
+# terms are left out of the ranked query (their IDF is close to zero anyway).
+FTS_MAX_POSTINGS = 500
+
+
+def fts_terms(query: str) -> List[str]:
+    """Distinct non-stopword terms of free text, in order."""
+    return list(dict.fromkeys(t for t in re.findall(r"\w+", query.lower()) if t not in FTS_STOPWORDS))
+
+
+def fts_query(terms: List[str], operator: str = "OR") -> str:
+    """An FTS5 query joining quoted terms (quoting neutralizes FTS syntax) with OR or AND."""
+    return f" {operator} ".join(f'"{t}"' for t in terms)
+
+
+class KnowledgeDB:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fts_available = True
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Opening thread -> its connection; a connection is closed once its thread has exited
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._schema_ready = False
+        # Terms seen matching more than FTS_MAX_POSTINGS rows; the table only ever grows past the budget
+        self._common_terms: Set[str] = set()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened (and the schema initialized) on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode: reads never hold a transaction open; writes use transaction()
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            with self._lock:
+                self._close_exited()
+                self._connections[threading.current_thread()] = conn
+                if not self._schema_ready:
+                    self._init_schema(conn)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """Write transaction; BEGIN IMMEDIATE takes the write lock up front so it can't deadlock on upgrade."""
+        conn = self.connection()
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            yield cur
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def search_qa(self, query: str, top_k: int = 3) -> List[Tuple[str, str, float, Optional[float]]]:
+        """
+        (question, answer, updated_at, score) rows for a keyword query, best first.
+
+        BM25 ranks on the query's selective terms. When every term is common,
+        ranking would scan most of the table, so the newest rows containing
+        all the terms are returned instead, topped up with the newest rows
+        containing any of them; those rows have no score.
+        """
+        if not self.fts_available:
+            like = f"%{query.strip()}%"
+            rows = self.execute("SELECT question, answer, updated_at FROM qa WHERE question LIKE ? OR answer LIKE ? ORDER BY updated_at DESC LIMIT ?", (like, like, top_k)).fetchall()
+            return [(q, a, ts, None) for (q, a, ts) in rows]
+        terms = fts_terms(query)
+        if not terms:
+            return []
+        selective = self.selective_terms(terms)
+        if selective:
+            # Rank and limit inside FTS5 first, then join only the top_k rows back to qa.
+            # rank is bm25(), which is lower-is-better.
+            rows = self.execute("""
+                SELECT qa.question, qa.answer, qa.updated_at, m.rank
+                FROM (SELECT rowid, rank FROM qa_fts WHERE qa_fts MATCH ? ORDER BY rank LIMIT ?) AS m
+                JOIN qa ON qa.id = m.rowid
+                ORDER BY m.rank
+            """, (fts_query(selective), top_k)).fetchall()
+            return [(q, a, ts, -rank) for (q, a, ts, rank) in rows]
+        results: List[Tuple[str, str, float, Optional[float]]] = []
+        for operator in ("AND", "OR") if len(terms) > 1 else ("OR",):
+            # Walking the doclists newest-first stops after top_k matches
+            rows = self.execute("""
+                SELECT qa.question, qa.answer, qa.updated_at
+                FROM (SELECT rowid FROM qa_fts WHERE qa_fts MATCH ? ORDER BY rowid DESC LIMIT ?) AS m
+                JOIN qa ON qa.id = m.rowid
+                ORDER BY m.rowid DESC
+            """, (fts_query(terms, operator), top_k)).fetchall()
+            seen = {q for q, _, _, _ in results}
+            results += [(q, a, ts, None) for (q, a, ts) in rows if q not in seen]
+            if len(results) >= top_k:
+                break
+        return results[:top_k]
+
+    def selective_terms(self, terms: List[str]) -> List[str]:
+        """
+        The terms to rank on: rarest first, while the rows they match add up
+        to at most FTS_MAX_POSTINGS. Each count stops past the budget, and a
+        term over it is remembered, so a common term costs one bounded probe.
+        """
+        counted = []
+        for term in terms:
+            if term in self._common_terms:
+                continue
+            count = self.execute("SELECT count(*) FROM (SELECT 1 FROM qa_fts WHERE qa_fts MATCH ? LIMIT ?)",
+                                 (fts_query([term]), FTS_MAX_POSTINGS + 1)).fetchone()[0]
+            if count > FTS_MAX_POSTINGS:
+                self._common_terms.add(term)
+            elif count:
+                counted.append((count, term))
+        selected, postings = [], 0
+        for count, term in sorted(counted):
+            if postings + count > FTS_MAX_POSTINGS:
+                break
+            selected.append(term)
+            postings += count
+        return selected
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+            self._local = threading.local()
+
+    def _close_exited(self):
+        # Called with self._lock held, whenever a thread opens its connection
+        for thread in [t for t in self._connections if not t.is_alive()]:
+            try:
+                self._connections.pop(thread).close()
+            except sqlite3.Error:
+                pass
+
+    def _init_schema(self, conn: sqlite3.Connection):
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'qa_changes'")
+            had_change_log = cur.fetchone() is not None
+            for statement in SCHEMA_SQL:
+                cur.execute(statement)
+            if not had_change_log:
+                # Migration for knowledge.db files whose index mark was a qa.updated_at timestamp:
+                # log every row so the next leader republishes them all by seq
+                cur.execute("INSERT INTO qa_changes (question) SELECT question FROM qa ORDER BY id")
+                cur.execute("UPDATE versions SET mark = 0 WHERE name = 'index'")
+            # Migration for knowledge.db files created before near-duplicate hit counting
+            columns = {row[1] for row in cur.execute("PRAGMA table_info(qa)").fetchall()}
+            if "hit_count" not in columns:
+                cur.execute("ALTER TABLE qa ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 1")
+            cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'qa_fts'")
+            if not cur.fetchone():
+                try:
+                    cur.execute("SAVEPOINT fts")
+                    for statement in QA_FTS_SQL:
+                        cur.execute(statement)
+                    # Migration for knowledge.db files created before the FTS index existed
+                    cur.execute("INSERT INTO qa_fts(qa_fts) VALUES ('rebuild')")
+                    cur.execute("RELEASE fts")
+                except sqlite3.OperationalError as e:
+                    # SQLite built without FTS5: fall back to LIKE search
+                    cur.execute("ROLLBACK TO fts")
+                    cur.execute("RELEASE fts")
+                    print(f"FTS5 unavailable, using LIKE search: {e}")
+                    self.fts_available = False
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+_instances: Dict[str, KnowledgeDB] = {}
+_instances_lock = threading.Lock()
+
+
+def get_db(path: str) -> KnowledgeDB:
+    """Process-wide KnowledgeDB for a database file."""
+    db = _instances.get(path)
+    if db is None:
+        with _instances_lock:
+            db = _instances.setdefault(path, KnowledgeDB(path))
+    return db
+
+
+@atexit.register
+def close_all():
+    for db in list(_instances.values()):
+        db.close()
@@ -0,0 +1,148 @@
+"""
+Write-behind buffer for Q&A upserts.
+
+add_common_qa() and auto-saves only record the write in memory. A worker
+thread commits everything pending in one transaction when the flush interval
+passes or the batch fills up, so a burst of writes costs one commit (and one
+WAL sync) instead of one per row; repeated writes of the same question
+collapse into one. Pending writes are flushed on shutdown.
+
+Readers in this process see pending writes through pending(), which the Q&A
+search and the index refresh overlay on top of what they read from SQLite.
+"""
+
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from knowledge_db import KnowledgeDB
+
+UPSERT_SQL = ("INSERT INTO qa (question, answer, updated_at) VALUES (?, ?, ?) "
+              "ON CONFLICT(question) DO UPDATE SET answer=excluded.answer, updated_at=excluded.updated_at")
+HIT_SQL = "UPDATE qa SET hit_count = hit_count + ? WHERE question = ?"
+
+
+class QAWriteBuffer:
+
+    def __init__(self, db: KnowledgeDB, flush_interval: float = 0.5, max_batch: int = 256):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        # question -> (answer, updated_at); later writes of a question replace earlier ones
+        self._upserts: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._hits: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # Bumped on every upsert; lets readers detect new pending writes without copying them
+        self.generation = 0
+        self.writes = 0
+        self.rows_written = 0
+        self.flushes = 0
+
+    def upsert(self, question: str, answer: str) -> float:
+        """Queue an upsert; returns the updated_at the row will be written with."""
+        now_ts = time.time()
+        with self._cond:
+            self._upserts.pop(question, None)
+            self._upserts[question] = (answer, now_ts)
+            self.generation += 1
+            self.writes += 1
+            self._wake()
+        return now_ts
+
+    def hit(self, question: str):
+        with self._cond:
+            self._hits[question] = self._hits.get(question, 0) + 1
+            self.writes += 1
+            self._wake()
+
+    def pending(self) -> Dict[str, Tuple[str, float]]:
+        """Upserts not yet committed: question -> (answer, updated_at)."""
+        with self._cond:
+            return dict(self._upserts)
+
+    def flush(self):
+        """Commit everything pending now, in one transaction."""
+        with self._flush_lock:
+            with self._cond:
+                upserts, hits = self._upserts, self._hits
+                if not upserts and not hits:
+                    return
+                self._upserts, self._hits = OrderedDict(), {}
+            try:
+                with self.db.transaction() as cur:
+                    cur.executemany(UPSERT_SQL, [(q, a, ts) for q, (a, ts) in upserts.items()])
+                    cur.executemany(HIT_SQL, [(n, q) for q, n in hits.items()])
+            except Exception:
+                # Put the batch back (newer writes of the same question win) and let the caller see the error
+                with self._cond:
+                    for q, value in upserts.items():
+                        self._upserts.setdefault(q, value)
+                    for q, n in hits.items():
+                        self._hits[q] = self._hits.get(q, 0) + n
+                raise
+            self.flushes += 1
+            self.rows_written += len(upserts) + len(hits)
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "writes": self.writes,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "writes_per_commit": round(self.writes / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+    def _wake(self):
+        # Called with self._cond held
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="qa-write-behind", daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not self._upserts and not self._hits:
+                    self._cond.wait()
+                # The first pending write starts the clock; a full batch flushes early
+                deadline = time.time() + self.flush_interval
+                while not self._stopping and len(self._upserts) + len(self._hits) < self.max_batch:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Q&A write-behind flush failed, will retry: {e}", flush=True)
+            if stopping:
+                return
+
+
+_writers: Dict[str, QAWriteBuffer] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(db: KnowledgeDB) -> QAWriteBuffer:
+    """Process-wide write buffer for a database; flushed at interpreter exit."""
+    writer = _writers.get(db.path)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(db.path)
+            if writer is None:
+                writer = _writers[db.path] = QAWriteBuffer(db)
+                atexit.register(writer.close)
+    return writer
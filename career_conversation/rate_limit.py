@@ -0,0 +1,55 @@
+"""
+Token-bucket rate limiting for the embeddings API.
+
+OpenAI enforces requests-per-minute and tokens-per-minute budgets per
+organization; going over them costs 429s and retries. RateLimiter holds one
+bucket per budget. reserve() takes what a request needs right away, possibly
+running the bucket into debt, and returns how long the caller must wait, so
+the same limiter serves threads (time.sleep) and the event loop
+(asyncio.sleep). Debt is repaid at the refill rate, so concurrent callers are
+spaced out instead of all firing at once.
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` now and return the seconds to wait before spending it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A single request larger than the bucket waits for a full bucket, not forever
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets; a budget of 0 is unlimited."""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+    def reserve(self, tokens: int) -> float:
+        wait = self.requests.reserve(1) if self.requests else 0.0
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def acquire(self, tokens: int):
+        """Block until a request of `tokens` tokens fits both budgets."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
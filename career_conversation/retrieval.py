@@ -0,0 +1,269 @@
+"""
+Vector retrieval helpers for the career conversation RAG index.
+
+Chunk embeddings are kept as a single L2-normalized float32 matrix so a query
+is scored with one matrix-vector product instead of a Python loop per chunk.
+VectorIndex adds keyed, incremental updates on top of that matrix (or of a
+shared on-disk store): replacing a document tombstones its old entries and
+appends the new ones. Updates can be made on a copy() and published by
+swapping the reference, so readers never see a half-applied update. Vector
+and keyword rankings are combined with reciprocal rank fusion.
+"""
+
+import copy
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize_rows(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Return a float32 matrix whose rows have unit length (zero rows stay zero)."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2 or matrix.shape[0] == 0:
+        return np.zeros((0, matrix.shape[-1] if matrix.ndim == 2 else 0), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return matrix / norms
+
+
+def normalize_vector(vector: Sequence[float]) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        return vec
+    return vec / norm
+
+
+def top_k_scores(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        top = np.argpartition(scores, n - k)[n - k:]
+    else:
+        top = np.arange(n)
+    return top[np.argsort(scores[top])[::-1]]
+
+
+def top_k_cosine(matrix: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Score a normalized query against a normalized matrix and return the best k (row, score) pairs."""
+    if matrix.shape[0] == 0 or query.shape[0] != matrix.shape[1]:
+        return []
+    scores = matrix @ query
+    return [(int(i), float(scores[i])) for i in top_k_scores(scores, k)]
+
+
+class MatrixVectors:
+    """Growable in-RAM float32 matrix; the default VectorIndex backing."""
+
+    shared = False
+
+    def __init__(self, matrix: Optional[np.ndarray] = None):
+        self._buf = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        self._size = self._buf.shape[0]
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._buf.shape[1] if self._buf.shape[1] else None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, chunk_ids: Sequence[str], vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if self._buf.shape[1] != dim:
+            if self._size:
+                raise ValueError(f"embedding dimension changed from {self._buf.shape[1]} to {dim}")
+            self._buf = np.zeros((0, dim), dtype=np.float32)
+        if self._size + n > self._buf.shape[0]:
+            # Amortized growth; also copies a read-only memory map into RAM on first append
+            buf = np.zeros((max(self._size + n, 2 * self._buf.shape[0], 64), dim), dtype=np.float32)
+            buf[:self._size] = self._buf[:self._size]
+            self._buf = buf
+        self._buf[self._size:self._size + n] = vectors
+        self._size += n
+        return np.arange(self._size - n, self._size)
+
+    def scores(self, query: np.ndarray, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+        # A private backing is compacted along with its index, so scoring every row and picking
+        # the live ones wastes little and avoids copying them out first
+        scores = self._buf[:self._size] @ query
+        return scores if rows is None else scores[np.asarray(rows, dtype=np.int64)]
+
+    def take(self, rows: Sequence[int]) -> np.ndarray:
+        return np.asarray(self._buf[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+
+    def subset(self, rows: Sequence[int]) -> "MatrixVectors":
+        return MatrixVectors(self.take(rows))
+
+
+class VectorIndex:
+    """
+    Chunk index keyed by source document (e.g. ("qa", question)).
+
+    Each entry points at a row of a vector backing: an in-RAM float32 matrix
+    by default, or a shared on-disk store (embedding_store.EmbeddingStore).
+    Replacing or removing a document only flips its entries to dead; dead
+    entries are compacted away once they make up most of the index. A private
+    RAM backing is compacted with them, a shared store is append-only.
+    """
+
+    def __init__(self, vectors=None, compact_ratio: float = 0.5, min_compact_rows: int = 256):
+        self.vectors = vectors if vectors is not None else MatrixVectors()
+        self.compact_ratio = compact_ratio
+        self.min_compact_rows = min_compact_rows
+        self.keys: List[Hashable] = []
+        self.chunks: List[str] = []
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._dead = 0
+        self._rows_by_key: Dict[Hashable, List[int]] = {}
+
+    @classmethod
+    def from_rows(cls, keys: List[Hashable], chunks: List[str], rows: Sequence[int], vectors, **kwargs) -> "VectorIndex":
+        """Rebuild an index over rows that already exist in `vectors` (no vectors are copied)."""
+        index = cls(vectors=vectors, **kwargs)
+        index.keys = list(keys)
+        index.chunks = list(chunks)
+        index._rows = np.asarray(rows, dtype=np.int64).copy()
+        index._alive = np.ones(len(index.keys), dtype=bool)
+        index._size = len(index.keys)
+        for pos, key in enumerate(index.keys):
+            index._rows_by_key.setdefault(key, []).append(pos)
+        return index
+
+    @classmethod
+    def from_arrays(cls, keys: List[Hashable], chunks: List[str], matrix: np.ndarray, **kwargs) -> "VectorIndex":
+        """
+        Build an index around an existing normalized matrix without copying it,
+        e.g. a read-only memory map; the first append copies it into RAM.
+        """
+        return cls.from_rows(keys, chunks, np.arange(matrix.shape[0]), MatrixVectors(matrix), **kwargs)
+
+    def copy(self) -> "VectorIndex":
+        """
+        Writable copy sharing the append-only vector backing. Update the copy and
+        swap it in: searches holding the old index keep a consistent view.
+        """
+        index = copy.copy(self)
+        index.keys = list(self.keys)
+        index.chunks = list(self.chunks)
+        index._rows = self._rows.copy()
+        index._alive = self._alive.copy()
+        # Position lists are replaced on update, never mutated, so they can be shared
+        index._rows_by_key = dict(self._rows_by_key)
+        return index
+
+    def entry_arrays(self) -> Tuple[List[Hashable], List[str], np.ndarray]:
+        """Keys, chunks and backing rows of the live (non-tombstoned) entries."""
+        live = np.flatnonzero(self._alive[:self._size])
+        return [self.keys[i] for i in live], [self.chunks[i] for i in live], self._rows[live]
+
+    def live_arrays(self) -> Tuple[List[Hashable], List[str], np.ndarray]:
+        """Keys, chunks and float32 vectors of the live entries."""
+        keys, chunks, rows = self.entry_arrays()
+        return keys, chunks, self.vectors.take(rows)
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows_by_key
+
+    @property
+    def tombstones(self) -> int:
+        return self._dead
+
+    def add(self, key: Hashable, chunks: List[str], vectors: np.ndarray, chunk_ids: Optional[Sequence[str]] = None):
+        """
+        Insert or replace every chunk of one document. `vectors` must already be
+        normalized; `chunk_ids` (content hashes) let a shared store skip rows it already holds.
+        """
+        # Remove first: compacting a private backing renumbers its rows
+        self.remove(key)
+        if not chunks:
+            return
+        rows = self.vectors.append(chunk_ids if chunk_ids is not None else [None] * len(chunks), vectors)
+        self.add_rows(key, chunks, rows)
+
+    def add_rows(self, key: Hashable, chunks: List[str], rows: Sequence[int]):
+        """Insert or replace a document whose vectors are already in the backing (e.g. added by another process)."""
+        self.remove(key)
+        if not chunks:
+            return
+        self._reserve(len(chunks))
+        start = self._size
+        end = start + len(chunks)
+        self._rows[start:end] = rows
+        self._alive[start:end] = True
+        self._size = end
+        self.keys.extend([key] * len(chunks))
+        self.chunks.extend(chunks)
+        self._rows_by_key[key] = list(range(start, end))
+
+    def remove(self, key: Hashable):
+        positions = self._rows_by_key.pop(key, None)
+        if positions:
+            self._alive[positions] = False
+            self._dead += len(positions)
+            self._maybe_compact()
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """Best k live entries for a normalized query as (score, entry position) pairs."""
+        if len(self) == 0 or query.shape[0] != self.vectors.dim:
+            return []
+        # Only live entries are scored: a shared store also holds replaced answers and other indexes' rows
+        live = np.flatnonzero(self._alive[:self._size])
+        scores = self.vectors.scores(query, self._rows[live])
+        top = top_k_scores(scores, k)
+        return [(float(scores[i]), int(live[i])) for i in top]
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= self._rows.shape[0]:
+            return
+        capacity = max(needed, 2 * self._rows.shape[0], 64)
+        rows = np.zeros(capacity, dtype=np.int64)
+        rows[:self._size] = self._rows[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._rows, self._alive = rows, alive
+
+    def _maybe_compact(self):
+        if self._dead < self.min_compact_rows or self._dead < self.compact_ratio * self._size:
+            return
+        live = np.flatnonzero(self._alive[:self._size])
+        rows = self._rows[live]
+        if getattr(self.vectors, "shared", False):
+            self._rows = rows.copy()
+        else:
+            self.vectors = self.vectors.subset(rows)
+            self._rows = np.arange(len(live))
+        self._alive = np.ones(len(live), dtype=bool)
+        self.keys = [self.keys[i] for i in live]
+        self.chunks = [self.chunks[i] for i in live]
+        self._size = len(live)
+        self._dead = 0
+        self._rows_by_key = {}
+        for pos, key in enumerate(self.keys):
+            self._rows_by_key.setdefault(key, []).append(pos)
+        self._after_compact(live)
+
+    def _after_compact(self, live: np.ndarray):
+        """Hook for subclasses keeping per-entry state; `live` holds the surviving old positions in order."""
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse several best-first rankings of document keys with reciprocal rank
+    fusion: score(d) = sum over rankings of 1 / (k + rank of d), rank from 1.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(dict.fromkeys(ranking), start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
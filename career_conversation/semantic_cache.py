@@ -0,0 +1,95 @@
+"""
+Semantic answer cache for the career chat.
+
+Answers are stored with the (normalized) embedding of the question that
+produced them. A new question whose embedding is within a cosine threshold of
+a stored one gets the stored answer back without any completion call.
+Entries expire after a TTL and the least recently used entry is evicted when
+the cache is full.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 24 * 3600, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # question -> (answer, unit vector, stored_at); order = least to most recently used
+        self._entries: "OrderedDict[str, Tuple[str, np.ndarray, float]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, query_vec: np.ndarray) -> Optional[Tuple[str, str, float]]:
+        """Return (stored question, answer, similarity) for the closest live entry above the threshold."""
+        with self._lock:
+            self._expire()
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_keys = list(self._entries)
+                    self._matrix = np.vstack([self._entries[k][1] for k in self._matrix_keys])
+                if self._matrix.shape[1] == query_vec.shape[0]:
+                    scores = self._matrix @ query_vec
+                    best = int(np.argmax(scores))
+                    score = float(scores[best])
+                    if score >= self.threshold:
+                        question = self._matrix_keys[best]
+                        self._entries.move_to_end(question)
+                        self.hits += 1
+                        return question, self._entries[question][0], score
+            self.misses += 1
+            return None
+
+    def put(self, question: str, answer: str, query_vec: np.ndarray):
+        question = question.strip()
+        with self._lock:
+            self._entries.pop(question, None)
+            self._entries[question] = (answer.strip(), np.asarray(query_vec, dtype=np.float32), time.time())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def invalidate(self, question: str, answer: Optional[str] = None):
+        """Drop the entry for `question`, unless it already holds `answer`."""
+        question = question.strip()
+        with self._lock:
+            entry = self._entries.get(question)
+            if entry is None or (answer is not None and entry[0] == answer.strip()):
+                return
+            del self._entries[question]
+            self._matrix = None
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _expire(self):
+        if self.ttl_seconds <= 0 or not self._entries:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        expired = [q for q, (_, _, stored_at) in self._entries.items() if stored_at < cutoff]
+        for q in expired:
+            del self._entries[q]
+        if expired:
+            self._matrix = None
@@ -0,0 +1,186 @@
+"""
+Cross-process sharing of the RAG index through knowledge.db.
+
+Every Gradio worker process used to poll SQLite at the start of each chat
+turn and re-derive its own index from the qa table. Instead:
+
+* Triggers bump a monotonic 'qa' counter in the versions table on every Q&A
+  change and log the changed question to qa_changes in commit order. A VersionWatcher thread per process notices commits from other
+  connections through PRAGMA data_version and copies the counters into
+  memory, so the per-turn freshness check is two integer comparisons.
+* One process at a time holds the leader lock. Only the leader turns Q&A
+  changes into index entries (chunks + rows of the shared embedding store)
+  and publishes them to index_entries under a new 'index' version, together
+  with the last qa_changes seq they cover (the mark).
+* Every process, the leader included, applies published entries newer than
+  the version it has seen. Vectors are never copied: entries point at rows of
+  the memory-mapped embedding store.
+
+If the leader exits, its flock is released and the next process to see a Q&A
+change takes over, resuming from the 'index' mark stored in the database.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from knowledge_db import KnowledgeDB
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process acts as leader (duplicate work, same result)
+    fcntl = None
+
+# (doc key, chunks or None when the document was removed, store rows, answer for Q&A keys)
+Entry = Tuple[Hashable, Optional[List[str]], List[int], Optional[str]]
+
+
+class VersionWatcher:
+
+    def __init__(self, db: KnowledgeDB, interval: float = 0.25):
+        self.db = db
+        self.interval = interval
+        self.versions: Dict[str, int] = {}
+        self._data_version: Optional[int] = None
+        # PRAGMA data_version is per connection, so every poll must use this one
+        self._conn: Optional[sqlite3.Connection] = None
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.poll()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-version-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._poll_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get(self, name: str) -> int:
+        """Last counter value seen; memory only."""
+        return self.versions.get(name, 0)
+
+    def poll(self) -> bool:
+        """Re-read the counters if another connection committed since the last poll."""
+        with self._poll_lock:
+            if self._conn is None:
+                self.db.connection()  # creates the versions table on first use
+                self._conn = sqlite3.connect(self.db.path, isolation_level=None, check_same_thread=False)
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return False
+            self._data_version = data_version
+            rows = self._conn.execute("SELECT name, version FROM versions").fetchall()
+            self.versions = {name: version for name, version in rows}
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Index version watcher poll failed: {e}", flush=True)
+
+
+class LeaderLock:
+    """Non-blocking, process-lifetime flock; the holder builds and publishes index entries."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None or fcntl is None
+
+    def acquire(self) -> bool:
+        if self.held:
+            return True
+        f = open(self.path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def read_mark(db: KnowledgeDB) -> Tuple[int, int]:
+    """(index version, last qa_changes seq covered by published entries)."""
+    row = db.execute("SELECT version, mark FROM versions WHERE name = 'index'").fetchone()
+    return (row[0], int(row[1])) if row else (0, 0)
+
+
+def relog_all_qa(db: KnowledgeDB):
+    """Log every Q&A row as changed so the next leader republishes all of them (e.g. after the embedding store was lost)."""
+    with db.transaction() as cur:
+        cur.execute("INSERT INTO qa_changes (question) SELECT question FROM qa ORDER BY id")
+
+
+def qa_changes_since(db: KnowledgeDB, seq: int) -> Tuple[Dict[str, Optional[str]], int]:
+    """
+    Questions changed after `seq` mapped to their current answer (None once
+    deleted), and the last seq read. One statement, so the answers and the
+    seq are consistent.
+    """
+    rows = db.execute(
+        "SELECT c.seq, c.question, qa.answer FROM qa_changes AS c LEFT JOIN qa ON qa.question = c.question "
+        "WHERE c.seq > ? ORDER BY c.seq",
+        (seq,),
+    ).fetchall()
+    changes: Dict[str, Optional[str]] = {}
+    last = seq
+    for change_seq, question, answer in rows:
+        changes[question] = answer
+        last = change_seq
+    return changes, last
+
+
+def publish(db: KnowledgeDB, model: str, entries: Sequence[Entry], mark: int) -> int:
+    """
+    Store entries under a new index version in one transaction and advance the
+    mark to `mark`; returns that version. Log rows up to the mark are pruned.
+    """
+    with db.transaction() as cur:
+        version = cur.execute("SELECT version FROM versions WHERE name = 'index'").fetchone()[0] + 1
+        cur.executemany(
+            "INSERT OR REPLACE INTO index_entries (model, doc_key, chunks, store_rows, answer, version) VALUES (?, ?, ?, ?, ?, ?)",
+            [(model, json.dumps(list(key)), json.dumps(chunks) if chunks is not None else None,
+              json.dumps([int(r) for r in rows]), answer, version) for key, chunks, rows, answer in entries],
+        )
+        cur.execute("UPDATE versions SET version = ?, mark = MAX(mark, ?) WHERE name = 'index'", (version, mark))
+        cur.execute("DELETE FROM qa_changes WHERE seq <= ?", (mark,))
+    return version
+
+
+def entries_since(db: KnowledgeDB, model: str, version: int) -> Tuple[List[Entry], int]:
+    """Entries published after `version`, oldest first, and the newest version among them."""
+    rows = db.execute(
+        "SELECT doc_key, chunks, store_rows, answer, version FROM index_entries WHERE model = ? AND version > ? ORDER BY version",
+        (model, version),
+    ).fetchall()
+    entries: List[Entry] = []
+    latest = version
+    for doc_key, chunks, store_rows, answer, entry_version in rows:
+        entries.append((tuple(json.loads(doc_key)), json.loads(chunks) if chunks is not None else None,
+                        json.loads(store_rows or "[]"), answer))
+        latest = max(latest, entry_version)
+    return entries, latest
+
+
+def leader_lock_path(db_path: str) -> str:
+    return os.path.splitext(db_path)[0] + ".leader"
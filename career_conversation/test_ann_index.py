@@ -0,0 +1,36 @@
+"""
+Tests for the IVF approximate nearest-neighbour index.
+"""
+
+import numpy as np
+
+from ann_index import IVFIndex
+from retrieval import VectorIndex, normalize_vector
+
+
+def test_ivf_index_inserts_deletes_and_reloads(tmp_path, unit_vectors):
+    rng = np.random.default_rng(4)
+    vecs = unit_vectors(rng, 300)
+    index = IVFIndex(min_train=200, nprobe=4)
+    for i in range(250):
+        index.add(("qa", i), [f"chunk {i}"], vecs[i:i + 1])
+    assert index.trained
+
+    # Incremental insert and a replaced answer, without retraining
+    index.add(("qa", "new"), ["new chunk"], vecs[299:300])
+    index.add(("qa", 7), ["replaced"], vecs[298:299])
+    assert index.chunks[index.search(vecs[299], k=1)[0][1]] == "new chunk"
+    assert index.chunks[index.search(vecs[298], k=1)[0][1]] == "replaced"
+    assert "chunk 7" not in [index.chunks[pos] for _, pos in index.search(vecs[7], k=5)]
+
+    # Probing every list is exact search
+    index.nprobe = index.centroids.shape[0]
+    exact = VectorIndex.from_arrays(*index.live_arrays())
+    query = normalize_vector(rng.standard_normal(8))
+    assert [index.chunks[p] for _, p in index.search(query, 5)] == [exact.chunks[p] for _, p in exact.search(query, 5)]
+
+    index.save(str(tmp_path / "knowledge.ivf.npz"))
+    reloaded = IVFIndex.from_arrays(*index.live_arrays(), min_train=200)
+    assert reloaded.load(str(tmp_path / "knowledge.ivf.npz"))
+    assert np.allclose(reloaded.centroids, index.centroids)
+    assert reloaded.chunks[reloaded.search(vecs[299], k=1)[0][1]] == "new chunk"
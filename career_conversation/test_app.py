@@ -0,0 +1,249 @@
+"""
+Tests for the Q&A tools and chat plumbing in app.py.
+"""
+
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from retrieval import VectorIndex, normalize_vector
+
+
+def test_search_common_qa_bm25_tracks_upserts(tmp_path, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "_db_path", lambda: str(tmp_path / "knowledge.db"))
+    app.add_common_qa("Which cloud platforms have you used?", "Mostly AWS and Azure.")
+    app.add_common_qa("Do you know Kubernetes?", "Yes, I run Kubernetes clusters in production.")
+    app.add_common_qa("What is your notice period?", "One month; Kubernetes work can start sooner.")
+
+    results = app.search_common_qa("kubernetes experience")["results"]
+    assert [r["question"] for r in results] == ["Do you know Kubernetes?", "What is your notice period?"]
+
+    app.add_common_qa("Do you know Kubernetes?", "I prefer Nomad.")
+    results = app.search_common_qa("kubernetes")["results"]
+    assert results[0]["answer"] == "I prefer Nomad."
+    assert app.search_common_qa("nomad")["results"][0]["question"] == "Do you know Kubernetes?"
+    assert app.search_common_qa("what is your")["results"] == []
+
+
+def test_auto_save_counts_near_duplicates(tmp_path, monkeypatch, unit_vectors):
+    import sqlite3
+    import app
+
+    # knowledge.db from before hit_count existed
+    path = str(tmp_path / "knowledge.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE qa (id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT UNIQUE, answer TEXT, updated_at REAL)")
+    conn.execute("INSERT INTO qa (question, answer, updated_at) VALUES ('What clouds do you use?', 'Mostly AWS.', 1.0)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(app, "_db_path", lambda: path)
+
+    rng = np.random.default_rng(5)
+    stored, paraphrase, unrelated = unit_vectors(rng, 3)
+    paraphrase = normalize_vector(stored + 0.1 * paraphrase)
+    me = app.Me.__new__(app.Me)
+    me.question_index = VectorIndex()
+    me.question_index.add(("qa", "What clouds do you use?"), ["What clouds do you use?"], stored[None, :])
+
+    me._auto_save_qa_pair("What cloud platforms do you work with?", "Mostly AWS, some Azure.", paraphrase)
+    me._auto_save_qa_pair("What is your notice period?", "One month, negotiable.", unrelated)
+    # An exact repeat is a duplicate whatever its embedding, and keeps the stored answer
+    me._auto_save_qa_pair("What clouds do you use?", "Only GCP these days.", unrelated)
+    app._qa_writer().flush()
+    rows = dict(app._db().execute("SELECT question, hit_count FROM qa").fetchall())
+    assert rows == {"What clouds do you use?": 3, "What is your notice period?": 1}
+    assert app.get_qa_answer("What clouds do you use?") == "Mostly AWS."
+
+
+def _chunk(content=None, tool_calls=None, finish_reason=None, usage=None):
+    if usage is not None:
+        return SimpleNamespace(choices=[], usage=usage)
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)], usage=None)
+
+
+def _call_delta(index, id=None, name=None, arguments=None):
+    function = SimpleNamespace(name=name, arguments=arguments) if name or arguments else None
+    return SimpleNamespace(index=index, id=id, function=function)
+
+
+def test_streamed_turn_reassembles_interleaved_tool_calls():
+    import app
+
+    turn = app._StreamedTurn()
+    chunks = [
+        _chunk(content="Let me check. "),
+        _chunk(tool_calls=[_call_delta(1, id="call_b", name="search_common_qa")]),
+        _chunk(tool_calls=[_call_delta(0, id="call_a", name="record_unknown_question")]),
+        _chunk(tool_calls=[_call_delta(1, arguments='{"query": '), _call_delta(0, arguments='{"question"')]),
+        _chunk(tool_calls=[_call_delta(0, arguments=': "pets?"}'), _call_delta(1, arguments='"aws"}')]),
+        _chunk(finish_reason="tool_calls"),
+        _chunk(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5)),
+    ]
+    assert [turn.feed(c) for c in chunks] == ["Let me check. ", "", "", "", "", "", ""]
+
+    assert turn.finish_reason == "tool_calls" and turn.usage.prompt_tokens == 10
+    # Calls come back in index order with their fragments joined
+    assert [(c["id"], c["function"]["name"], c["function"]["arguments"]) for c in turn.tool_calls()] == [
+        ("call_a", "record_unknown_question", '{"question": "pets?"}'),
+        ("call_b", "search_common_qa", '{"query": "aws"}'),
+    ]
+    message = turn.assistant_message()
+    assert message["content"] == "Let me check. " and message["tool_calls"] == turn.tool_calls()
+    assert app._StreamedTurn().assistant_message() == {"role": "assistant", "content": None, "tool_calls": []}
+
+
+def test_answer_cache_replays_only_stored_first_turn_answers(tmp_path, monkeypatch, unit_vectors):
+    import app
+    from history import HistoryCompactor
+    from semantic_cache import SemanticCache
+
+    monkeypatch.setattr(app, "_db_path", lambda: str(tmp_path / "knowledge.db"))
+    me = app.Me.__new__(app.Me)
+    me.name = "Test"
+    me.prompt_mode = "retrieval"
+    me.index, me.question_index = VectorIndex(), VectorIndex()
+    me.answer_cache = SemanticCache(threshold=0.9)
+    me.history = HistoryCompactor(lambda previous, messages: previous, keep_turns=4, token_budget=3000)
+    monkeypatch.setattr(me, "_build_rag_context", lambda *args, **kwargs: "")
+    question, answer = "Do you hold AWS certifications?", "I hold the AWS Certified Security specialty."
+    vec = unit_vectors(np.random.default_rng(6), 1)[0]
+
+    # A turn that ran a side-effecting tool (e.g. record_user_details) is neither stored nor cached
+    me._finish_turn(question, [], "Thanks Jane, I noted jane@example.com and will be in touch.", vec, side_effects=True)
+    assert len(me.answer_cache) == 0 and app.get_qa_answer(question) is None
+
+    me._finish_turn(question, [], answer, vec)
+    assert app.get_qa_answer(question) == answer
+    assert me._prepare_turn(question, [], vec)[0] == answer
+    # A cache hit still counts as another ask of the stored question
+    app._qa_writer().flush()
+    assert app._db().execute("SELECT hit_count FROM qa WHERE question = ?", (question,)).fetchone() == (2,)
+    # Follow-ups depend on the conversation so far and always reach the model
+    history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}]
+    cached, messages = me._prepare_turn("Tell me more", history, vec)
+    assert cached is None and messages[-1] == {"role": "user", "content": "Tell me more"}
+
+    # Deleting the stored row stops it being replayed
+    me._apply_entries([(("qa", question), None, [], None)])
+    assert me._prepare_turn(question, [], vec)[0] is None
+
+
+def test_quantizer_trained_on_refresh_is_persisted(tmp_path, monkeypatch, unit_vectors):
+    import app
+    from ann_index import IVFIndex
+    from embedding_store import EmbeddingStore
+    from semantic_cache import SemanticCache
+
+    path = str(tmp_path / "knowledge.ivf-test.npz")
+    monkeypatch.setattr(app, "_ann_path", lambda model, questions=False: path)
+    store = EmbeddingStore(str(tmp_path / "store"))
+    store.append([str(i) for i in range(12)], unit_vectors(np.random.default_rng(7), 12))
+    me = app.Me.__new__(app.Me)
+    me.embedder = SimpleNamespace(name="test")
+    me.index, me.question_index = IVFIndex(store, min_train=10), VectorIndex()
+    me.answer_cache = SemanticCache(threshold=0.9)
+
+    me._apply_entries([(("profile", i), [f"chunk {i}"], [i], None) for i in range(6)])
+    assert not me.index.trained and not os.path.exists(path)
+    # Crossing min_train trains the quantizer on the refresher's copy; it is saved with the swap
+    me._apply_entries([(("profile", i), [f"chunk {i}"], [i], None) for i in range(6, 12)])
+    assert me.index.trained
+    reloaded = IVFIndex.from_rows(*me.index.entry_arrays(), store, min_train=10)
+    assert reloaded.load(path) and np.array_equal(reloaded.centroids, me.index.centroids)
+
+
+def test_question_index_uses_ivf_with_its_own_quantizer(tmp_path, monkeypatch, unit_vectors):
+    import app
+    from ann_index import IVFIndex
+    from embedding_cache import content_hash
+    from embedding_store import EmbeddingStore
+    from semantic_cache import SemanticCache
+
+    monkeypatch.setattr(app, "RETRIEVAL_INDEX", "ivf")
+    monkeypatch.setattr(app, "IVF_MIN_TRAIN", 10)
+    paths = {False: str(tmp_path / "chunks.npz"), True: str(tmp_path / "questions.npz")}
+    monkeypatch.setattr(app, "_ann_path", lambda model, questions=False: paths[questions])
+    questions = [f"question {i}?" for i in range(12)]
+    store = EmbeddingStore(str(tmp_path / "store"))
+    store.append([content_hash(q) for q in questions], unit_vectors(np.random.default_rng(8), 12))
+    me = app.Me.__new__(app.Me)
+    me.embedder = SimpleNamespace(name="test")
+    me.embedding_store = store
+    me.answer_cache = SemanticCache(threshold=0.9)
+    me.index, me.question_index = VectorIndex(), me._build_question_index([])
+    assert isinstance(me.question_index, IVFIndex)
+
+    me._apply_entries([(("qa", q), [], [], None) for q in questions])
+    # Training the question index persists its quantizer apart from the chunk index's
+    assert me.question_index.trained and os.path.exists(paths[True]) and not os.path.exists(paths[False])
+    reloaded = me._build_question_index([("qa", q) for q in questions])
+    assert reloaded.trained and np.array_equal(reloaded.centroids, me.question_index.centroids)
+
+
+class _FakeAsyncStream:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def test_achat_runs_a_streamed_tool_call_turn(tmp_path, monkeypatch, unit_vectors):
+    import asyncio
+    import json
+    import app
+    from history import HistoryCompactor
+    from semantic_cache import SemanticCache
+
+    monkeypatch.setattr(app, "_db_path", lambda: str(tmp_path / "knowledge.db"))
+    app.add_common_qa("What clouds do you use?", "Mostly AWS.")
+    vec = unit_vectors(np.random.default_rng(9), 1)[0]
+    turns = [
+        [_chunk(tool_calls=[_call_delta(0, id="call_a", name="search_common_qa", arguments='{"query": "clouds"}')]),
+         _chunk(finish_reason="tool_calls")],
+        [_chunk(content="Mostly AWS, "), _chunk(content="with some GCP."), _chunk(finish_reason="stop"),
+         _chunk(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5))],
+    ]
+    requests = []
+
+    async def create(**kwargs):
+        requests.append([dict(m) for m in kwargs["messages"]])
+        return _FakeAsyncStream(turns[len(requests) - 1])
+
+    async def aembed(texts):
+        return np.array([vec] * len(texts))
+
+    me = app.Me.__new__(app.Me)
+    me.name = "Test"
+    me.prompt_mode = "retrieval"
+    me.index, me.question_index = VectorIndex(), VectorIndex()
+    me.answer_cache = SemanticCache(threshold=0.9)
+    me.history = HistoryCompactor(lambda previous, messages: previous, keep_turns=4, token_budget=3000)
+    me.embedder = SimpleNamespace(name="test", aembed=aembed)
+    me.async_openai = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(me, "_build_rag_context", lambda *args, **kwargs: "")
+
+    async def collect():
+        return [partial async for partial in me.achat("What cloud platforms do you use at work?", [])]
+
+    partials = asyncio.run(collect())
+    assert partials[-1] == "Mostly AWS, with some GCP."
+    # The tool ran between the two completions and its result was sent back with the assistant's call
+    assert len(requests) == 2
+    assistant, tool = requests[1][-2:]
+    assert assistant["tool_calls"][0]["function"] == {"name": "search_common_qa", "arguments": '{"query": "clouds"}'}
+    assert tool["tool_call_id"] == "call_a"
+    assert json.loads(tool["content"])["results"][0]["answer"] == "Mostly AWS."
+    # A read-only tool turn is still a context-free first-turn answer: it is stored and cached
+    assert app.get_qa_answer("What cloud platforms do you use at work?") == "Mostly AWS, with some GCP."
+    assert len(me.answer_cache) == 1
@@ -0,0 +1,19 @@
+"""
+Tests for the token-aware profile and Q&A chunker.
+"""
+
+from chunking import chunk_profile, chunk_qa
+from tokens import count_tokens
+
+
+def test_chunker_keeps_sentences_and_qa_pairs_whole():
+    sentences = [f"Sentence number {i} talks about cloud work." for i in range(40)]
+    text = " ".join(sentences[:20]) + "\n\n" + " ".join(sentences[20:]) + "\n\n" + " ".join(sentences[:20])
+    chunks = chunk_profile(text, max_tokens=40)
+    assert all(count_tokens(c) <= 40 for c in chunks)
+    # Nothing is cut mid-sentence, and the repeated paragraph adds no new chunks
+    assert all(c.endswith(".") for c in chunks)
+    assert len(chunks) == len(set(chunks)) == len(chunk_profile(" ".join(sentences[:20]) + "\n\n" + " ".join(sentences[20:]), max_tokens=40))
+
+    long_answer = "word " * 2000
+    assert len(chunk_qa("What do you do?", long_answer)) == 1
@@ -0,0 +1,48 @@
+"""
+Tests for the remote and local embedding backends.
+"""
+
+import numpy as np
+
+from embedding_backends import HashingBackend, OpenAIBackend
+from retrieval import normalize_rows
+
+
+def test_hashing_backend_is_deterministic_and_lexical():
+    backend = HashingBackend(dim=512)
+    texts = ["Which AWS certifications do you hold?", "I hold the AWS Certified Security certification.",
+             "I really dislike mushrooms."]
+    vectors = normalize_rows(backend.embed(texts))
+    assert vectors.shape == (3, 512) and backend.name == "hashing-512"
+    assert np.array_equal(backend.embed(texts[:1]), backend.embed(texts[:1]))
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_openai_backend_batches_by_tokens_and_retries_429s():
+    import threading
+    from types import SimpleNamespace
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    calls = []
+    lock = threading.Lock()
+
+    class Embeddings:
+        def create(self, model, input):
+            with lock:
+                calls.append(list(input))
+                if len(calls) == 1:
+                    raise RateLimited()
+            return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(t)), 1.0]) for t in input])
+
+    texts = [("word " * n).strip() for n in range(1, 41)]
+    backend = OpenAIBackend(SimpleNamespace(embeddings=Embeddings()), max_batch_tokens=60, concurrency=4,
+                            backoff_base=0.01)
+    vectors = backend.embed(texts)
+
+    # Results come back in input order although batches ran concurrently and one was retried
+    assert vectors[:, 0].tolist() == [float(len(t)) for t in texts]
+    batches = backend._batches(texts)
+    assert len(batches) > 1 and all(tokens <= 60 or len(batch) == 1 for batch, tokens in batches)
+    assert backend.retries == 1 and backend.requests == len(batches) + 1
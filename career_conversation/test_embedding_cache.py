@@ -0,0 +1,39 @@
+"""
+Tests for the legacy content-hashed embedding cache.
+"""
+
+import time
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, content_hash
+from knowledge_db import KnowledgeDB
+
+
+def _put(db, model, items):
+    """Rows as older releases wrote them; the cache itself is read-only now."""
+    with db.transaction() as cur:
+        cur.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, content_hash, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(model, h, len(vec), np.asarray(vec, dtype=np.float32).tobytes(), time.time()) for h, vec in items],
+        )
+
+
+def test_embedding_cache_hits_misses_and_models(tmp_path):
+    db = KnowledgeDB(str(tmp_path / "knowledge.db"))
+    cache = EmbeddingCache(db)
+    a, b = content_hash("chunk a"), content_hash("chunk b")
+    assert a != b and a == content_hash("chunk a")
+    assert cache.get_many("m1", [a, b]) == {}
+
+    _put(db, "m1", [(a, [1.0, 2.0]), (b, [3.0, 4.0])])
+    found = cache.get_many("m1", [a, a, b, content_hash("chunk c")])
+    assert sorted(found) == sorted([a, b])
+    assert found[a].dtype == np.float32 and found[b].tolist() == [3.0, 4.0]
+    # Vectors are per model: another model's vector space is a miss
+    assert cache.get_many("m2", [a]) == {}
+
+    _put(db, "m1", [(a, [5.0, 6.0, 7.0])])
+    assert cache.get_many("m1", [a])[a].tolist() == [5.0, 6.0, 7.0]
+    assert len(cache.get_many("m1", [content_hash(str(i)) for i in range(1200)] + [b])) == 1
+    db.close()
@@ -0,0 +1,45 @@
+"""
+Tests for the shared memory-mapped embedding store.
+"""
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+from retrieval import VectorIndex
+
+
+def test_embedding_store_appends_without_rewriting(tmp_path, unit_vectors):
+    rng = np.random.default_rng(3)
+    vecs = unit_vectors(rng, 3)
+    store = EmbeddingStore(str(tmp_path))
+    assert list(store.append(["a", "b"], vecs[:2])) == [0, 1]
+    before = (tmp_path / "vectors.f16").read_bytes()
+
+    # Known IDs keep their row; only "c" is written, after the existing bytes
+    assert list(store.append(["b", "c"], vecs[1:])) == [1, 2]
+    assert (tmp_path / "vectors.f16").read_bytes()[:len(before)] == before
+
+    # Another process opening the directory sees the same rows through the memory map
+    other = EmbeddingStore(str(tmp_path))
+    index = VectorIndex.from_rows([("qa", "x"), ("qa", "y")], ["x", "y"], [0, 2], other)
+    score, pos = index.search(vecs[2], k=1)[0]
+    assert index.chunks[pos] == "y"
+    assert abs(score - 1.0) < 1e-2
+
+
+def test_search_scores_only_live_rows(tmp_path, unit_vectors):
+    rng = np.random.default_rng(4)
+    vecs = unit_vectors(rng, 6)
+    store = EmbeddingStore(str(tmp_path))
+    store.append([str(i) for i in range(6)], vecs)
+    assert np.allclose(store.scores(vecs[0], [4, 1]), store.scores(vecs[0])[[4, 1]])
+
+    # Rows 0-2 are someone else's; row 3 is a replaced answer
+    index = VectorIndex.from_rows([("qa", "x"), ("qa", "y")], ["x", "y"], [3, 4], store)
+    index.add_rows(("qa", "x"), ["new x"], [5])
+    scored = []
+    scores = store.scores
+    store.scores = lambda query, rows=None: scored.append(list(rows)) or scores(query, rows)
+    hits = index.search(vecs[3], k=3)
+    assert scored == [[4, 5]]
+    assert {index.chunks[pos] for _, pos in hits} == {"y", "new x"}
@@ -0,0 +1,32 @@
+"""
+Tests for chat history compaction.
+"""
+
+from history import HistoryCompactor
+from tokens import count_message_tokens
+
+
+def test_history_summary_is_extended_incrementally():
+    calls = []
+
+    def summarize(previous, messages):
+        calls.append((previous, [m["content"] for m in messages]))
+        return (previous + " " if previous else "") + "+".join(m["content"] for m in messages if m["role"] == "user")
+
+    def history(turns):
+        return [m for i in range(turns) for m in ({"role": "user", "content": f"u{i}"}, {"role": "assistant", "content": f"a{i}"})]
+
+    compactor = HistoryCompactor(summarize, keep_turns=2, token_budget=1000)
+    compacted = compactor.compact(history(5))
+    assert compacted[0]["content"].endswith("u0+u1+u2")
+    assert [m["content"] for m in compacted[1:]] == ["u3", "a3", "u4", "a4"]
+
+    # Next message: only the turn that just left the verbatim window is summarized
+    compactor.compact(history(6))
+    assert calls[-1] == ("u0+u1+u2", ["u3", "a3"])
+    compactor.compact(history(6))
+    assert len(calls) == 2
+
+    tight = HistoryCompactor(summarize, keep_turns=4, token_budget=60)
+    long_history = [{"role": "user", "content": "word " * 100}, {"role": "assistant", "content": "reply " * 100}]
+    assert count_message_tokens(tight.compact(long_history * 3)) <= 60
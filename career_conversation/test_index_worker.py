@@ -0,0 +1,34 @@
+"""
+Tests for the background index refresher.
+"""
+
+from index_worker import IndexRefresher
+
+
+def test_index_refresher_debounces_write_bursts():
+    import time
+
+    state = {"written": 0, "indexed": 0}
+    refreshed = []
+
+    def refresh():
+        refreshed.append(state["written"])
+        state["indexed"] = state["written"]
+        return True
+
+    refresher = IndexRefresher(lambda: state["written"] if state["written"] != state["indexed"] else None,
+                               refresh, debounce=0.2, max_delay=2.0, poll_interval=0.02)
+    refresher.start()
+    for _ in range(10):
+        state["written"] += 1
+        time.sleep(0.03)
+    deadline = time.time() + 3.0
+    while not refreshed and time.time() < deadline:
+        time.sleep(0.02)
+    refresher.stop()
+
+    # The burst produced one refresh that saw every write
+    assert refreshed == [10]
+    stats = refresher.stats()
+    assert stats["refreshes"] == 1 and stats["stale_for_seconds"] == 0.0
+    assert stats["last_staleness_seconds"] >= 0.2
@@ -0,0 +1,94 @@
+"""
+Tests for the bulk Q&A ingestion CLI.
+"""
+
+from types import SimpleNamespace
+
+from embedding_backends import HashingBackend
+from embedding_cache import content_hash
+from embedding_store import EmbeddingStore
+from ingest_qa import ingest, read_rows
+from knowledge_db import KnowledgeDB
+
+
+def test_ingest_streams_csv_and_jsonl_with_embeddings(tmp_path):
+    import json
+
+    csv_path = tmp_path / "qa.csv"
+    csv_path.write_text('question,answer\n"Do you use Terraform?","Yes, for all AWS infrastructure."\n'
+                        '"Empty answer?",""\n"Do you mentor?","Yes, two junior engineers."\n', encoding="utf-8")
+    jsonl_path = tmp_path / "qa.jsonl"
+    jsonl_path.write_text(json.dumps({"question": "Do you mentor?", "answer": "Yes, four engineers now."}) + "\n",
+                          encoding="utf-8")
+    db = KnowledgeDB(str(tmp_path / "knowledge.db"))
+    backend = HashingBackend(dim=64)
+    store = EmbeddingStore(str(tmp_path / "store"))
+
+    stats = ingest(db, read_rows(str(csv_path)), batch_size=1, backend=backend, store=store)
+    assert (stats["read"], stats["skipped"], stats["written"], stats["transactions"]) == (3, 1, 2, 2)
+    # Each pair's chunk and its question on its own
+    assert stats["embedded"] == 4 and len(store) == 4
+    ingest(db, read_rows(str(jsonl_path)), keep_existing=True)
+    assert db.execute("SELECT answer FROM qa WHERE question = 'Do you mentor?'").fetchone()[0] == "Yes, two junior engineers."
+    ingest(db, read_rows(str(jsonl_path)))
+    assert db.execute("SELECT answer FROM qa WHERE question = 'Do you mentor?'").fetchone()[0] == "Yes, four engineers now."
+    # The keyword index was written in the same transactions
+    assert db.execute("SELECT COUNT(*) FROM qa_fts WHERE qa_fts MATCH 'terraform'").fetchone()[0] == 1
+    db.close()
+
+
+def test_keep_existing_skips_embedding_existing_questions(tmp_path):
+    db = KnowledgeDB(str(tmp_path / "knowledge.db"))
+    with db.transaction() as cur:
+        cur.execute("INSERT INTO qa (question, answer, updated_at) VALUES ('Do you mentor?', 'Yes.', 1.0)")
+    store = EmbeddingStore(str(tmp_path / "store"))
+    rows = [("Do you mentor?", "Yes, four engineers now."), ("Do you use Terraform?", "Yes, for AWS.")]
+
+    stats = ingest(db, iter(rows), keep_existing=True, backend=HashingBackend(dim=64), store=store)
+    assert (stats["existing"], stats["written"], stats["embedded"]) == (1, 1, 2) and len(store) == 2
+    assert db.execute("SELECT answer FROM qa WHERE question = 'Do you mentor?'").fetchone()[0] == "Yes."
+    db.close()
+
+
+def test_cli_defaults_come_from_dotenv(tmp_path, monkeypatch):
+    import sys
+
+    import ingest_qa
+
+    csv_path = tmp_path / "qa.csv"
+    csv_path.write_text('question,answer\n"Do you use Terraform?","Yes."\n', encoding="utf-8")
+    monkeypatch.delenv("EMBEDDING_BACKEND", raising=False)
+    monkeypatch.delenv("LOCAL_EMBEDDING_DIM", raising=False)
+
+    def load_dotenv(override=False):
+        # What .env would set
+        monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+        monkeypatch.setenv("LOCAL_EMBEDDING_DIM", "16")
+
+    monkeypatch.setattr(ingest_qa, "load_dotenv", load_dotenv)
+    monkeypatch.setattr(sys, "argv", ["ingest_qa.py", str(csv_path), "--db", str(tmp_path / "knowledge.db"),
+                                      "--store-dir", str(tmp_path / "store")])
+    ingest_qa.main()
+    assert EmbeddingStore(str(tmp_path / "store")).dim == 16
+
+
+def test_app_embeds_nothing_after_ingest(tmp_path):
+    import app
+    from embedding_cache import EmbeddingCache
+
+    db = KnowledgeDB(str(tmp_path / "knowledge.db"))
+    backend = HashingBackend(dim=64)
+    store = EmbeddingStore(str(tmp_path / "store"))
+    rows = [("Do you use Terraform?", "Yes, for AWS."), ("Do you mentor?", "Yes, two engineers.")]
+    ingest(db, iter(rows), backend=backend, store=store)
+
+    embedded = []
+    me = app.Me.__new__(app.Me)
+    me.embedder = SimpleNamespace(name=backend.name, embed=lambda texts: embedded.extend(texts) or backend.embed(texts))
+    me.embedding_store, me.embedding_cache = store, EmbeddingCache(db)
+    # What the leader's first refresh does with the ingested rows
+    entries = me._embed_qa_pairs(dict(rows))
+    assert embedded == []
+    assert [key for key, _, _, _ in entries] == [("qa", q) for q, _ in rows]
+    assert me._question_rows([q for q, _ in rows]) == [store.row_of(content_hash(q)) for q, _ in rows]
+    db.close()
@@ -0,0 +1,88 @@
+"""
+Tests for the knowledge.db connection manager and schema migration.
+"""
+
+import sqlite3
+import threading
+
+import knowledge_db
+from knowledge_db import KnowledgeDB, fts_query
+
+
+def test_legacy_database_is_migrated_once(tmp_path):
+    path = str(tmp_path / "knowledge.db")
+    # knowledge.db from before hit counts, the FTS index and the version counters
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE qa (id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT UNIQUE, answer TEXT, updated_at REAL)")
+    conn.execute("INSERT INTO qa (question, answer, updated_at) VALUES ('Do you use Terraform?', 'Yes, daily.', 1.0)")
+    conn.commit()
+    conn.close()
+
+    db = KnowledgeDB(path)
+    assert db.execute("SELECT hit_count FROM qa").fetchone() == (1,)
+    # Existing rows are logged for the next index publish
+    assert db.execute("SELECT question FROM qa_changes").fetchall() == [("Do you use Terraform?",)]
+    # Existing rows were indexed by the migration, new ones by the triggers
+    assert db.execute("SELECT rowid FROM qa_fts WHERE qa_fts MATCH ?", (fts_query(["terraform"]),)).fetchall() == [(1,)]
+    qa_version = db.execute("SELECT version FROM versions WHERE name = 'qa'").fetchone()[0]
+    with db.transaction() as cur:
+        cur.execute("INSERT INTO qa (question, answer, updated_at) VALUES ('Do you mentor?', 'Yes.', 2.0)")
+    assert db.execute("SELECT COUNT(*) FROM qa_fts WHERE qa_fts MATCH 'mentor'").fetchone()[0] == 1
+    assert db.execute("SELECT version FROM versions WHERE name = 'qa'").fetchone()[0] == qa_version + 1
+    db.close()
+
+    # Opening again finds the schema in place
+    db = KnowledgeDB(path)
+    assert db.execute("SELECT COUNT(*) FROM qa").fetchone()[0] == 2
+    db.close()
+
+
+def test_search_ranks_on_selective_terms_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge_db, "FTS_MAX_POSTINGS", 2)
+    db = KnowledgeDB(str(tmp_path / "knowledge.db"))
+    with db.transaction() as cur:
+        cur.executemany("INSERT INTO qa (question, answer, updated_at) VALUES (?, ?, ?)", [
+            ("Do you use AWS?", "Yes, AWS daily.", 1.0),
+            ("Which AWS services?", "Lambda and Terraform on AWS.", 2.0),
+            ("Do you know Terraform?", "Yes.", 3.0),
+            ("AWS certifications?", "Solutions Architect.", 4.0),
+        ])
+
+    # "aws" matches 3 rows, over the budget of 2: only "terraform" is ranked on
+    assert db.selective_terms(["aws", "terraform", "nomad"]) == ["terraform"]
+    rows = db.search_qa("aws terraform", top_k=3)
+    assert [q for q, _, _, _ in rows] == ["Do you know Terraform?", "Which AWS services?"]
+    assert all(score is not None for _, _, _, score in rows)
+
+    # All terms common: newest rows containing all of them, then any of them, unscored
+    with db.transaction() as cur:
+        cur.execute("INSERT INTO qa (question, answer, updated_at) VALUES ('Terraform or CDK?', 'Terraform.', 5.0)")
+    assert db.selective_terms(["aws", "terraform"]) == []
+    rows = db.search_qa("aws terraform", top_k=3)
+    assert [q for q, _, _, _ in rows] == ["Which AWS services?", "Terraform or CDK?", "AWS certifications?"]
+    assert [score for _, _, _, score in rows] == [None, None, None]
+    db.close()
+
+
+def test_connections_are_per_thread_and_reused(tmp_path):
+    db = KnowledgeDB(str(tmp_path / "knowledge.db"))
+    assert db.connection() is db.connection()
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not db.connection()
+    db.close()
+
+
+def test_connections_of_exited_threads_are_closed(tmp_path):
+    db = KnowledgeDB(str(tmp_path / "knowledge.db"))
+    db.connection()
+    for _ in range(20):
+        thread = threading.Thread(target=lambda: db.execute("SELECT COUNT(*) FROM qa").fetchone())
+        thread.start()
+        thread.join()
+    # The main thread's connection and at most the last worker's remain open
+    assert len(db._connections) <= 2
+    db.close()
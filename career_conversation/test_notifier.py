@@ -0,0 +1,121 @@
+"""
+Tests for the background Pushover dispatcher.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import requests
+
+import notifier
+from notifier import PushoverDispatcher
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def _spooled(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [text for (text,) in conn.execute("SELECT message FROM spool ORDER BY id").fetchall()]
+    except sqlite3.OperationalError:
+        return []  # the spool table isn't created yet
+    finally:
+        conn.close()
+
+
+def test_messages_are_spooled_before_the_window_closes_and_survive_a_restart(tmp_path, monkeypatch):
+    spool = str(tmp_path / "push_spool.db")
+    posted = []
+    sending, release = threading.Event(), threading.Event()
+
+    def blocked_post(url, data, timeout):
+        sending.set()
+        release.wait()
+        return SimpleNamespace(status_code=503, text="")
+
+    monkeypatch.setattr(requests, "post", blocked_post)
+    first = PushoverDispatcher(spool, token="t", user="u", coalesce_seconds=60.0)
+    first.notify("lead: ada@example.com")
+    # On disk right away, not held in memory for the 60 s coalescing window
+    assert _wait_until(lambda: _spooled(spool) == ["lead: ada@example.com"])
+
+    # The first send blocks; a message arriving meanwhile is spooled too
+    threading.Thread(target=first.flush, args=(5.0,), daemon=True).start()
+    assert sending.wait(5.0)
+    first.notify("unknown question: pets?")
+    assert _wait_until(lambda: _spooled(spool) == ["lead: ada@example.com", "unknown question: pets?"])
+
+    # The process dies here: a new dispatcher delivers everything it left behind, including
+    # the row the dead process had claimed (claim_seconds=0 stands in for the claim lapsing)
+    monkeypatch.setattr(requests, "post", lambda url, data, timeout: posted.append(data["message"]) or SimpleNamespace(status_code=200))
+    second = PushoverDispatcher(spool, token="t", user="u", coalesce_seconds=0.0, claim_seconds=0.0)
+    second.start()
+    assert _wait_until(lambda: _spooled(spool) == [])
+    assert posted == ["• lead: ada@example.com\n• unknown question: pets?"]
+    second.close()
+    release.set()
+    first.close(timeout=1.0)
+
+
+def test_a_failed_body_does_not_resend_bodies_already_accepted(tmp_path, monkeypatch):
+    spool = str(tmp_path / "push_spool.db")
+    statuses = iter([200, 503])
+    posted = []
+
+    def post(url, data, timeout):
+        posted.append(data["message"])
+        return SimpleNamespace(status_code=next(statuses, 200), text="")
+
+    monkeypatch.setattr(requests, "post", post)
+    dispatcher = PushoverDispatcher(spool, token="t", user="u", coalesce_seconds=0.5, base_backoff=0.01)
+    # Too long to share one Pushover body: the batch goes out as two
+    dispatcher.notify("a" * 600)
+    dispatcher.notify("b" * 600)
+    assert _wait_until(lambda: len(_spooled(spool)) == 2)
+    assert dispatcher.flush(timeout=5.0)
+
+    first, second = f"• {'a' * 600}", f"• {'b' * 600}"
+    assert posted == [first, second, "b" * 600]
+    assert dispatcher.sent == 2 and dispatcher.failed_attempts == 1
+    assert _spooled(spool) == []
+    dispatcher.close()
+
+
+def test_processes_sharing_a_spool_send_each_row_once(tmp_path, monkeypatch):
+    spool = str(tmp_path / "push_spool.db")
+    posted = []
+    lock = threading.Lock()
+
+    def post(url, data, timeout):
+        with lock:
+            posted.append(data["message"])
+        time.sleep(0.05)
+        return SimpleNamespace(status_code=200)
+
+    monkeypatch.setattr(requests, "post", post)
+    # Two Gradio workers' dispatchers on one spool file
+    workers = [PushoverDispatcher(spool, token="t", user="u", coalesce_seconds=0.2) for _ in range(2)]
+    for i, worker in enumerate(workers):
+        worker.notify(f"message {i}")
+    # Each flush returns once its message is delivered, whichever process posted it
+    assert all(worker.flush(timeout=5.0) for worker in workers)
+
+    lines = [line.lstrip("• ") for body in posted for line in body.split("\n")]
+    assert sorted(lines) == ["message 0", "message 1"]
+    for worker in workers:
+        worker.close()
+
+
+def test_crew_copy_is_identical():
+    crew_copy = os.path.join(os.path.dirname(__file__), "..", "crew_projects", "stock_planner", "src",
+                             "stock_planner", "tools", "notifier.py")
+    with open(notifier.__file__, encoding="utf-8") as a, open(crew_copy, encoding="utf-8") as b:
+        assert a.read() == b.read()
@@ -0,0 +1,22 @@
+"""
+Tests for the write-behind Q&A buffer.
+"""
+
+from knowledge_db import KnowledgeDB
+from qa_writer import QAWriteBuffer
+
+
+def test_qa_write_behind_batches_into_one_commit(tmp_path):
+    db = KnowledgeDB(str(tmp_path / "knowledge.db"))
+    writer = QAWriteBuffer(db, flush_interval=60.0)
+    for i in range(50):
+        writer.upsert(f"q{i % 10}", f"a{i}")
+    writer.hit("q1")
+    assert db.execute("SELECT COUNT(*) FROM qa").fetchone()[0] == 0
+    assert writer.pending()["q3"][0] == "a43"
+
+    writer.close()
+    assert writer.stats()["flushes"] == 1
+    assert db.execute("SELECT COUNT(*) FROM qa").fetchone()[0] == 10
+    assert db.execute("SELECT answer, hit_count FROM qa WHERE question = 'q1'").fetchone() == ("a41", 2)
+    db.close()
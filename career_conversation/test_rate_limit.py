@@ -0,0 +1,12 @@
+"""
+Tests for the embeddings API rate limiter.
+"""
+
+from rate_limit import TokenBucket
+
+
+def test_token_bucket_spaces_out_requests_past_the_burst():
+    bucket = TokenBucket(per_minute=600)  # 10 per second
+    assert bucket.reserve(600) == 0.0
+    assert abs(bucket.reserve(5) - 0.5) < 0.05
+    assert abs(bucket.reserve(5) - 1.0) < 0.05
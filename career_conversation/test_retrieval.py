@@ -0,0 +1,71 @@
+"""
+Tests for the in-memory RAG index used by the career conversation app.
+"""
+
+import numpy as np
+
+from retrieval import VectorIndex, normalize_vector, reciprocal_rank_fusion, top_k_cosine
+
+
+def test_top_k_cosine_matches_full_sort(unit_vectors):
+    rng = np.random.default_rng(0)
+    matrix = unit_vectors(rng, 200)
+    query = normalize_vector(rng.standard_normal(8))
+    expected = np.argsort(matrix @ query)[::-1][:5]
+    assert [i for i, _ in top_k_cosine(matrix, query, 5)] == list(expected)
+
+
+def test_vector_index_replace_tombstones_old_rows(unit_vectors):
+    rng = np.random.default_rng(1)
+    index = VectorIndex()
+    vecs = unit_vectors(rng, 3)
+    index.add(("qa", "q1"), ["old answer"], vecs[:1])
+    index.add(("qa", "q2"), ["other"], vecs[1:2])
+    index.add(("qa", "q1"), ["new answer"], vecs[2:3])
+
+    assert len(index) == 2
+    assert index.tombstones == 1
+    hits = index.search(vecs[0], k=3)
+    assert "old answer" not in [index.chunks[row] for _, row in hits]
+    top_score, top_row = index.search(vecs[2], k=1)[0]
+    assert index.chunks[top_row] == "new answer"
+    assert abs(top_score - 1.0) < 1e-5
+
+
+def test_vector_index_compacts_dead_rows(unit_vectors):
+    rng = np.random.default_rng(2)
+    index = VectorIndex(min_compact_rows=2)
+    for i in range(8):
+        index.add(("qa", i), [f"chunk {i}"], unit_vectors(rng, 1))
+    for i in range(6):
+        index.remove(("qa", i))
+
+    assert index.tombstones == 0
+    assert index.chunks == ["chunk 6", "chunk 7"]
+    assert ("qa", 7) in index
+    assert len(index.search(unit_vectors(rng, 1)[0], k=10)) == 2
+
+
+def test_vector_index_copy_leaves_published_index_untouched(unit_vectors):
+    rng = np.random.default_rng(11)
+    vectors = unit_vectors(rng, 300)
+    published = VectorIndex(min_compact_rows=8)
+    for i in range(300):
+        published.add(("doc", i), [f"chunk {i}"], vectors[i:i + 1])
+    before = published.search(vectors[7], 3)
+
+    # Remove most documents on a copy (tombstones, then compaction into a new backing) and replace one
+    updated = published.copy()
+    for i in range(8, 300):
+        updated.remove(("doc", i))
+    updated.add(("doc", 7), ["new chunk 7"], vectors[7:8])
+    assert updated.vectors is not published.vectors and len(updated) == 8
+    assert updated.chunks[updated.search(vectors[7], 1)[0][1]] == "new chunk 7"
+    assert published.search(vectors[7], 3) == before
+    assert published.chunks[before[0][1]] == "chunk 7" and len(published) == 300
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+    assert [key for key, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
@@ -0,0 +1,31 @@
+"""
+Tests for the semantic answer cache.
+"""
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def test_semantic_cache_threshold_lru_and_ttl(monkeypatch, unit_vectors):
+    rng = np.random.default_rng(3)
+    a, b, c = unit_vectors(rng, 3)
+    cache = SemanticCache(threshold=0.9, ttl_seconds=60, max_entries=2)
+    cache.put("q-a", "answer a", a)
+    cache.put("q-b", "answer b", b)
+
+    assert cache.lookup(a)[1] == "answer a"
+    assert cache.lookup(c) is None
+    cache.put("q-c", "answer c", c)  # evicts q-b, the least recently used
+    assert cache.lookup(b) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["evictions"] == 1
+
+    cache.invalidate("q-a", "answer a")
+    assert cache.lookup(a) is not None
+    cache.invalidate("q-a", "rewritten")
+    assert cache.lookup(a) is None
+
+    import semantic_cache
+    now = semantic_cache.time.time()
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now + 120)
+    assert cache.lookup(c) is None and len(cache) == 0
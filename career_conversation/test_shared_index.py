@@ -0,0 +1,69 @@
+"""
+Tests for cross-process index versions and the leader lock.
+"""
+
+from knowledge_db import KnowledgeDB
+from shared_index import LeaderLock, VersionWatcher, entries_since, publish, read_mark, relog_all_qa
+
+
+def test_shared_index_versions_and_leader(tmp_path):
+    path = str(tmp_path / "knowledge.db")
+    leader_db, follower_db = KnowledgeDB(path), KnowledgeDB(path)
+    watcher = VersionWatcher(follower_db)
+    watcher.poll()
+    qa_before = watcher.get("qa")
+
+    # Another connection's commit is seen by the watcher; Q&A triggers bump 'qa'
+    with leader_db.transaction() as cur:
+        cur.execute("INSERT INTO qa (question, answer, updated_at) VALUES ('q', 'a', 5.0)")
+    assert watcher.poll() and watcher.get("qa") == qa_before + 1
+    assert not watcher.poll()
+
+    version = publish(leader_db, "m", [(("qa", "q"), ["Q: q\nA: a"], [3], "a")], 5.0)
+    watcher.poll()
+    assert watcher.get("index") == version and read_mark(follower_db) == (version, 5.0)
+    entries, latest = entries_since(follower_db, "m", 0)
+    assert entries == [(("qa", "q"), ["Q: q\nA: a"], [3], "a")] and latest == version
+    assert entries_since(follower_db, "m", version) == ([], version)
+
+    first, second = LeaderLock(str(tmp_path / "leader")), LeaderLock(str(tmp_path / "leader"))
+    assert first.acquire() and not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+    leader_db.close()
+    follower_db.close()
+
+
+def test_late_write_behind_commit_is_still_published(tmp_path):
+    from qa_writer import QAWriteBuffer
+    from shared_index import qa_changes_since
+
+    path = str(tmp_path / "knowledge.db")
+    db_a, db_b = KnowledgeDB(path), KnowledgeDB(path)
+    writer_a, writer_b = QAWriteBuffer(db_a, flush_interval=60.0), QAWriteBuffer(db_b, flush_interval=60.0)
+
+    # A's row is stamped first but committed last
+    stamped_a = writer_a.upsert("Do you mentor?", "Yes.")
+    writer_b.upsert("Do you use Terraform?", "Daily.")
+    writer_b.flush()
+    changes, seq = qa_changes_since(db_b, read_mark(db_b)[1])
+    assert changes == {"Do you use Terraform?": "Daily."}
+    publish(db_b, "m", [], seq)
+    writer_a.flush()
+    assert db_a.execute("SELECT updated_at FROM qa WHERE question = 'Do you mentor?'").fetchone()[0] == stamped_a
+
+    changes, seq = qa_changes_since(db_b, read_mark(db_b)[1])
+    assert changes == {"Do you mentor?": "Yes."}
+    publish(db_b, "m", [], seq)
+    # Deletions are changes too; published log rows are pruned
+    with db_a.transaction() as cur:
+        cur.execute("DELETE FROM qa WHERE question = 'Do you mentor?'")
+    assert qa_changes_since(db_b, read_mark(db_b)[1])[0] == {"Do you mentor?": None}
+    assert db_b.execute("SELECT MIN(seq) FROM qa_changes").fetchone()[0] > seq
+    relog_all_qa(db_b)
+    assert qa_changes_since(db_b, seq)[0] == {"Do you mentor?": None, "Do you use Terraform?": "Daily."}
+    writer_a.close()
+    writer_b.close()
+    db_a.close()
+    db_b.close()
@@ -0,0 +1,113 @@
+"""
+Tests for the typed chat tool registry.
+"""
+
+from tool_registry import ToolRegistry
+
+
+def test_tool_registry_schemas_parallel_reads_and_turn_memo():
+    import asyncio
+    import json
+    import threading
+    from typing import Annotated
+
+    registry = ToolRegistry()
+    barrier = threading.Barrier(2, timeout=2.0)
+    searches = []
+    saved = []
+
+    @registry.tool("Search", read_only=True)
+    def search(query: Annotated[str, "Keywords"], top_k: int = 3):
+        searches.append(query)
+        if query in ("a", "b"):
+            barrier.wait()  # only returns if both reads run at the same time
+        return {"results": [query] * top_k}
+
+    @registry.tool("Save")
+    def save(text: str):
+        saved.append(text)
+        return {"status": "ok"}
+
+    params = registry.get("search").schema["parameters"]
+    assert params["required"] == ["query"]
+    assert params["properties"] == {"query": {"type": "string", "description": "Keywords"},
+                                    "top_k": {"type": "integer", "default": 3}}
+    assert registry.get("save").schema["parameters"]["required"] == ["text"]
+
+    def call(i, name, **arguments):
+        return {"id": f"c{i}", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+    memo = {}
+    messages = registry.run([call(0, "search", query="a"), call(1, "search", query="b")], memo)
+    assert [m["tool_call_id"] for m in messages] == ["c0", "c1"]
+    assert json.loads(messages[1]["content"]) == {"results": ["b", "b", "b"]}
+
+    # Repeats within the turn are memoized until a side effect invalidates them
+    registry.run([call(2, "search", query="a"), call(3, "nope")], memo)
+    assert searches.count("a") == 1
+    messages = registry.run([call(4, "save", text="x"), call(5, "search", query="a")], memo)
+    assert saved == ["x"] and searches.count("a") == 2
+    assert json.loads(messages[0]["content"]) == {"status": "ok"}
+
+    messages = asyncio.run(registry.arun([call(6, "search", query="c", top_k=1), call(7, "nope")], {}, timeout=1.0))
+    assert json.loads(messages[0]["content"]) == {"results": ["c"]}
+    assert json.loads(messages[1]["content"]) == {"error": "unknown tool nope"}
+
+
+def test_tool_registry_reuses_a_bounded_pool():
+    import json
+    import threading
+
+    registry = ToolRegistry(max_workers=2)
+    threads = set()
+
+    @registry.tool("Search", read_only=True)
+    def search(query: str):
+        threads.add(threading.current_thread().name)
+        return {"results": []}
+
+    for turn in range(50):
+        calls = [{"id": f"c{i}", "function": {"name": "search", "arguments": json.dumps({"query": f"{turn}-{i}"})}}
+                 for i in range(3)]
+        assert len(registry.run(calls, {})) == 3
+    assert len(threads) <= 2
+
+
+def test_arun_times_out_one_call_and_keeps_call_order():
+    import asyncio
+    import json
+    import threading
+
+    registry = ToolRegistry()
+    release = threading.Event()
+
+    @registry.tool("Slow lookup", read_only=True)
+    def slow(query: str):
+        release.wait(5.0)
+        return {"slow": query}
+
+    @registry.tool("Fast lookup", read_only=True)
+    def fast(query: str):
+        return {"fast": query}
+
+    @registry.tool("Save")
+    def save(text: str):
+        return {"saved": text}
+
+    def call(i, name, **arguments):
+        return {"id": f"c{i}", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+    calls = [call(0, "fast", query="a"), call(1, "slow", query="b"), call(2, "fast", query="c"), call(3, "save", text="d")]
+
+    async def run():
+        try:
+            return await registry.arun(calls, {}, timeout=0.2)
+        finally:
+            # Let the abandoned worker thread finish before asyncio.run() joins the executor
+            release.set()
+
+    messages = asyncio.run(run())
+    assert [m["tool_call_id"] for m in messages] == ["c0", "c1", "c2", "c3"]
+    assert [json.loads(m["content"]) for m in messages] == [
+        {"fast": "a"}, {"error": "slow timed out"}, {"fast": "c"}, {"saved": "d"},
+    ]
@@ -0,0 +1,32 @@
+"""
+Tests for the warm-start profile/index snapshot.
+"""
+
+import os
+
+from warm_start import load_snapshot, save_snapshot
+
+
+def test_snapshot_is_validated_against_sources_model_and_store(tmp_path):
+    source = tmp_path / "summary.txt"
+    source.write_text("I build cloud platforms.", encoding="utf-8")
+    sources = [str(source)]
+    directory = str(tmp_path / "warm")
+    save_snapshot(directory, sources, "m", {"summary": "I build cloud platforms."},
+                  [("profile", 0), ("qa", "q")], ["chunk 0", "Q: q\nA: a"], [0, 1], 7)
+
+    snapshot = load_snapshot(directory, sources, "m", store_rows=2)
+    assert snapshot["keys"] == [("profile", 0), ("qa", "q")] and snapshot["index_version"] == 7
+    assert load_snapshot(directory, sources, "other-model", store_rows=2) is None
+    # A row past the end of the embedding store means the store was replaced
+    assert load_snapshot(directory, sources, "m", store_rows=1) is None
+
+    # Touched but unchanged: the mtime differs, the sha256 still matches
+    stat = os.stat(source)
+    os.utime(source, (stat.st_atime, stat.st_mtime + 10))
+    assert load_snapshot(directory, sources, "m", store_rows=2) is not None
+
+    # Same size, different content
+    source.write_text("I build cloud platformz.", encoding="utf-8")
+    assert load_snapshot(directory, sources, "m", store_rows=2) is None
+    assert load_snapshot(directory, sources + [str(tmp_path / "linkedin.pdf")], "m", store_rows=2) is None
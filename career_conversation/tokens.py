@@ -0,0 +1,69 @@
+"""
+Token counting for chunk and prompt budgets.
+
+Uses tiktoken's cl100k_base encoding (what text-embedding-3-small and the
+gpt-4o-mini family count in, closely enough for budgeting). Without tiktoken
+installed (or its BPE file not downloadable), counts fall back to ~4
+characters per token.
+"""
+
+from functools import lru_cache
+from typing import Iterable, List
+
+try:
+    import tiktoken
+except ImportError:  # budgets become approximate
+    tiktoken = None
+
+ENCODING = "cl100k_base"
+CHARS_PER_TOKEN = 4  # fallback estimate
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING)
+    except Exception as e:  # first use downloads the BPE file; offline hosts fall back to estimates
+        print(f"tiktoken encoding {ENCODING} unavailable, estimating token counts: {e}", flush=True)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """`text` cut down to at most `max_tokens` tokens."""
+    enc = _encoding()
+    if enc is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    ids = enc.encode(text, disallowed_special=())
+    return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
+
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """Hard split into consecutive pieces of at most `max_tokens` tokens (last resort for run-on text)."""
+    enc = _encoding()
+    if enc is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    ids = enc.encode(text, disallowed_special=())
+    return [enc.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+
+
+def count_message_tokens(messages: Iterable[dict]) -> int:
+    """Approximate prompt tokens of a chat request: content plus per-message framing."""
+    total = 3  # every reply is primed with <|start|>assistant<|message|>
+    for message in messages:
+        total += 3
+        for value in message.values():
+            if isinstance(value, str):
+                total += count_tokens(value)
+    return total
@@ -0,0 +1,199 @@
+"""
+Typed registry for the chat tools.
+
+A tool is a plain function registered with @registry.tool(description, read_only=...).
+Its OpenAI function schema is generated once, at import, from the signature:
+annotations give the JSON Schema types (Annotated[str, "..."] adds a
+parameter description), parameters without a default are required, and
+defaults are recorded. There is no hand-written schema to drift out of sync
+with the code.
+
+Dispatch keeps the model's call order for results and side effects:
+
+* consecutive calls to read-only (side-effect-free) tools run in parallel;
+* a call with side effects runs alone, after everything before it, and
+  clears the turn's memo;
+* read-only results are memoized for the rest of the turn, so the model
+  asking the same search twice costs one query.
+"""
+
+import asyncio
+import inspect
+import json
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+# One user turn's memoized read-only results: (tool name, canonical arguments JSON) -> tool message content
+TurnMemo = Dict[Tuple[str, str], str]
+
+
+def _json_schema(annotation) -> Tuple[Dict[str, Any], Optional[str]]:
+    """JSON Schema for a parameter annotation, plus its Annotated description if any."""
+    description = None
+    if typing.get_origin(annotation) is typing.Annotated:
+        annotation, *extras = typing.get_args(annotation)
+        description = next((e for e in extras if isinstance(e, str)), None)
+    args = [a for a in typing.get_args(annotation) if a is not type(None)]
+    if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+        annotation = args[0]  # Optional[X]
+    origin = typing.get_origin(annotation) or annotation
+    schema: Dict[str, Any] = {"type": _JSON_TYPES.get(origin, "string")}
+    if origin is list and typing.get_args(annotation):
+        schema["items"] = _json_schema(typing.get_args(annotation)[0])[0]
+    return schema, description
+
+
+class Tool:
+
+    def __init__(self, fn: Callable, description: str, read_only: bool = False):
+        self.fn = fn
+        self.name = fn.__name__
+        self.description = description
+        self.read_only = read_only
+        self.schema = self._build_schema()
+
+    def _build_schema(self) -> dict:
+        hints = typing.get_type_hints(self.fn, include_extras=True)
+        properties: Dict[str, dict] = {}
+        required: List[str] = []
+        for name, param in inspect.signature(self.fn).parameters.items():
+            schema, description = _json_schema(hints.get(name, str))
+            if description:
+                schema["description"] = description
+            if param.default is inspect.Parameter.empty:
+                required.append(name)
+            elif param.default is not None:
+                schema["default"] = param.default
+            properties[name] = schema
+        return {
+            "name": self.name,
+            "description": self.description,
+            "parameters": {"type": "object", "properties": properties, "required": required,
+                           "additionalProperties": False},
+        }
+
+
+class ToolRegistry:
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._tools: Dict[str, Tool] = {}
+        # One long-lived pool for every turn: tool threads (and the per-thread knowledge.db
+        # connections they open) are reused instead of created per batch of calls
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def tool(self, description: str, read_only: bool = False) -> Callable[[Callable], Callable]:
+        """Register the decorated function as a tool; the function itself is returned unchanged."""
+        def register(fn: Callable) -> Callable:
+            self._tools[fn.__name__] = Tool(fn, description, read_only)
+            return fn
+        return register
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def schemas(self) -> List[dict]:
+        """The `tools` argument for chat.completions.create."""
+        return [{"type": "function", "function": tool.schema} for tool in self._tools.values()]
+
+    def has_side_effects(self, tool_calls: List[dict]) -> bool:
+        """Whether any of the calls goes to a registered tool that is not read-only."""
+        return any(call["function"]["name"] in self and not self._is_read_only(call) for call in tool_calls)
+
+    def run(self, tool_calls: List[dict], memo: Optional[TurnMemo] = None) -> List[dict]:
+        """Execute one assistant message's tool calls; returns the tool messages in call order."""
+        memo = {} if memo is None else memo
+        results: List[Optional[dict]] = [None] * len(tool_calls)
+        for group in self._groups(tool_calls):
+            if len(group) == 1:
+                results[group[0]] = self._run_one(tool_calls[group[0]], memo)
+                continue
+            for i, message in zip(group, self._pool.map(lambda i: self._run_one(tool_calls[i], memo), group)):
+                results[i] = message
+        return results
+
+    async def arun(self, tool_calls: List[dict], memo: Optional[TurnMemo] = None,
+                   timeout: Optional[float] = None) -> List[dict]:
+        """Async run(): tools execute in worker threads, each bounded by `timeout` seconds."""
+        memo = {} if memo is None else memo
+        results: List[Optional[dict]] = [None] * len(tool_calls)
+        for group in self._groups(tool_calls):
+            messages = await asyncio.gather(*(self._arun_one(tool_calls[i], memo, timeout) for i in group))
+            for i, message in zip(group, messages):
+                results[i] = message
+        return results
+
+    # -------------------- internals --------------------
+    def _groups(self, tool_calls: List[dict]) -> List[List[int]]:
+        """Call positions batched into runs of read-only calls; every other call is its own batch."""
+        groups: List[List[int]] = []
+        previous_read_only = False
+        for i, call in enumerate(tool_calls):
+            read_only = self._is_read_only(call)
+            if read_only and previous_read_only:
+                groups[-1].append(i)
+            else:
+                groups.append([i])
+            previous_read_only = read_only
+        return groups
+
+    def _is_read_only(self, call: dict) -> bool:
+        tool = self.get(call["function"]["name"])
+        return tool is not None and tool.read_only
+
+    def _prepare(self, call: dict, memo: TurnMemo) -> Tuple[Optional[Tool], dict, Optional[Tuple[str, str]], Optional[str]]:
+        """(tool, arguments, memo key, memoized content) for a call."""
+        name = call["function"]["name"]
+        print(f"Tool called: {name}", flush=True)
+        tool = self.get(name)
+        arguments = json.loads(call["function"]["arguments"] or "{}")
+        key = (name, json.dumps(arguments, sort_keys=True)) if tool is not None and tool.read_only else None
+        return tool, arguments, key, memo.get(key) if key else None
+
+    def _finish(self, call: dict, tool: Optional[Tool], key, result, memo: TurnMemo) -> dict:
+        content = json.dumps(result)
+        if key is not None:
+            memo[key] = content
+        elif tool is not None:
+            # A side effect may change what the read-only tools would return
+            memo.clear()
+        return {"role": "tool", "content": content, "tool_call_id": call["id"]}
+
+    def _run_one(self, call: dict, memo: TurnMemo) -> dict:
+        name = call["function"]["name"]
+        tool = key = None
+        try:
+            tool, arguments, key, cached = self._prepare(call, memo)
+            if cached is not None:
+                return {"role": "tool", "content": cached, "tool_call_id": call["id"]}
+            result = tool.fn(**arguments) if tool else {"error": f"unknown tool {name}"}
+        except Exception as e:
+            print(f"Tool {name} failed: {e}", flush=True)
+            return {"role": "tool", "content": json.dumps({"error": str(e)}), "tool_call_id": call["id"]}
+        return self._finish(call, tool, key, result, memo)
+
+    async def _arun_one(self, call: dict, memo: TurnMemo, timeout: Optional[float]) -> dict:
+        name = call["function"]["name"]
+        tool = key = None
+        try:
+            tool, arguments, key, cached = self._prepare(call, memo)
+            if cached is not None:
+                return {"role": "tool", "content": cached, "tool_call_id": call["id"]}
+            if tool is None:
+                result = {"error": f"unknown tool {name}"}
+            else:
+                # Tools are blocking functions; a timed-out one keeps running in its thread but no longer holds up the turn
+                result = await asyncio.wait_for(asyncio.to_thread(tool.fn, **arguments), timeout)
+        except asyncio.TimeoutError:
+            print(f"Tool {name} timed out after {timeout}s", flush=True)
+            return {"role": "tool", "content": json.dumps({"error": f"{name} timed out"}), "tool_call_id": call["id"]}
+        except Exception as e:
+            print(f"Tool {name} failed: {e}", flush=True)
+            return {"role": "tool", "content": json.dumps({"error": str(e)}), "tool_call_id": call["id"]}
+        return self._finish(call, tool, key, result, memo)
@@ -0,0 +1,105 @@
+"""
+Warm-start snapshot for the career conversation app.
+
+Holds what Me.__init__ otherwise recomputes on every boot: the text extracted
+from the profile sources and the index chunks with their keys. Vectors are not
+copied into the snapshot: each chunk records its row in the shared float16
+embedding store (embedding_store.EmbeddingStore), so loading costs a JSON
+parse plus an mmap of the store regardless of corpus size. Q&A entries
+published after the snapshot are applied from knowledge.db by index version
+(see shared_index.py).
+
+A snapshot is only used when every source file still matches: equal mtime and
+size is trusted outright, otherwise the file's sha256 must match the recorded
+one (so a touched-but-unchanged PDF doesn't force a rebuild).
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+SNAPSHOT_VERSION = 4  # bumped whenever chunking or the manifest layout changes
+MANIFEST = "manifest.json"
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path: str) -> Dict[str, object]:
+    st = os.stat(path)
+    return {"mtime": st.st_mtime, "size": st.st_size, "sha256": _sha256_file(path)}
+
+
+def _source_matches(path: str, recorded: Dict[str, object]) -> bool:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if st.st_mtime == recorded.get("mtime") and st.st_size == recorded.get("size"):
+        return True
+    return st.st_size == recorded.get("size") and _sha256_file(path) == recorded.get("sha256")
+
+
+def load_snapshot(directory: str, sources: List[str], model: str, store_rows: int) -> Optional[dict]:
+    """
+    Return the snapshot dict (texts, keys, chunks, rows, index_version) or
+    None if it is missing, from another format/model, any source changed, or
+    it points past the `store_rows` rows the embedding store holds.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != SNAPSHOT_VERSION or manifest.get("model") != model:
+        return None
+    recorded = manifest.get("sources", {})
+    if set(recorded) != set(sources) or not all(_source_matches(p, recorded[p]) for p in sources):
+        return None
+    rows = manifest.get("rows", [])
+    if len(rows) != len(manifest.get("chunks", [])) or any(not 0 <= r < store_rows for r in rows):
+        return None
+    return {
+        "texts": manifest["texts"],
+        "keys": [tuple(k) for k in manifest["keys"]],
+        "chunks": manifest["chunks"],
+        "rows": rows,
+        "index_version": manifest["index_version"],
+    }
+
+
+def save_snapshot(directory: str, sources: List[str], model: str, texts: Dict[str, str],
+                  keys: list, chunks: List[str], rows: List[int], index_version: int):
+    """
+    Write a new snapshot. The manifest is swapped in with os.replace, so a
+    concurrent reader sees the old or the new snapshot, never a mix; the store
+    rows it points at are append-only and never change underneath it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "model": model,
+        "sources": {p: fingerprint(p) for p in sources},
+        "texts": texts,
+        "keys": [list(k) for k in keys],
+        "chunks": chunks,
+        "rows": [int(r) for r in rows],
+        "index_version": index_version,
+    }
+    tmp = os.path.join(directory, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+    # Version 1 snapshots kept a float32 .npy matrix per snapshot
+    for name in os.listdir(directory):
+        if name.startswith("embeddings-") and name.endswith(".npy"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
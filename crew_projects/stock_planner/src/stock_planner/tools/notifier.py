@@ -0,0 +1,330 @@
+"""
+Background Pushover dispatcher.
+
+notify() only puts the message on an in-process queue, so callers return
+immediately. A spooler thread writes each message to a SQLite spool as soon
+as it is dequeued; a sender thread reads the spool, coalesces what has
+accumulated into batched Pushover messages, and deletes each body's rows
+once Pushover accepted it, so a failure part-way through a batch resends
+only the bodies that did not go out. Failures are retried with exponential
+backoff, and messages still in the spool are resent when the process starts
+again.
+
+Every worker process may share one spool file. A sender claims the rows it
+is about to post in a write transaction, so no two processes send the same
+row; a claim older than `claim_seconds` (its process died mid-send) lapses
+and the rows are picked up again. A process also counts its messages as
+delivered when a sibling delivered them, so flush() does not wait them out.
+
+This file is shared verbatim by career_conversation and the stock_planner
+crew (test_notifier.py checks the copies match); callers pass their own
+default spool path to get_dispatcher().
+"""
+
+import atexit
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import requests
+
+PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
+PUSHOVER_MAX_CHARS = 1024
+# While this process has messages out, how often the sender checks whether a sibling delivered them
+SETTLE_POLL_SECONDS = 0.5
+
+
+class PushoverDispatcher:
+
+    def __init__(self, spool_path: str, token: Optional[str] = None, user: Optional[str] = None,
+                 coalesce_seconds: float = 2.0, max_batch: int = 20, request_timeout: float = 10.0,
+                 base_backoff: float = 1.0, max_backoff: float = 300.0, claim_seconds: float = 600.0):
+        self.spool_path = spool_path
+        self.token = token if token is not None else os.getenv("PUSHOVER_TOKEN")
+        self.user = user if user is not None else os.getenv("PUSHOVER_USER")
+        self.coalesce_seconds = coalesce_seconds
+        self.max_batch = max_batch
+        self.request_timeout = request_timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # Must outlast a whole claimed batch: up to max_batch bodies of request_timeout each
+        self.claim_seconds = claim_seconds
+        self.sent = 0
+        self.failed_attempts = 0
+        self._queue: "queue.Queue[Optional[Tuple[float, str]]]" = queue.Queue()
+        self._stopping = False
+        self._spooler: Optional[threading.Thread] = None
+        self._sender: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # Marks this dispatcher's claims on spool rows
+        self._owner = uuid.uuid4().hex
+        # Set when rows were spooled, a flush was requested or the dispatcher is closing
+        self._wake = threading.Event()
+        self._flushing = False
+        # Messages accepted by notify() in this process and not yet delivered (or dropped)
+        self._outstanding = 0
+        self._live_ids: set = set()
+        self._done = threading.Condition()
+
+    def start(self):
+        """Start the worker threads; also resends whatever an earlier process left in the spool."""
+        with self._start_lock:
+            if self._spooler is None or not self._spooler.is_alive():
+                self._stopping = False
+                self._spooler = threading.Thread(target=self._spool_loop, name="pushover-spooler", daemon=True)
+                self._spooler.start()
+                self._sender = threading.Thread(target=self._send_loop, name="pushover-sender", daemon=True)
+                self._sender.start()
+
+    def notify(self, text: str):
+        """Queue a message; never blocks on disk or network."""
+        with self._done:
+            self._outstanding += 1
+        self._queue.put((time.time(), text))
+        if self._spooler is None:
+            self.start()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Send spooled messages without waiting out the coalescing window; wait until all are delivered (or the timeout passes)."""
+        self._flushing = True
+        self._wake.set()
+        try:
+            with self._done:
+                return self._done.wait_for(lambda: self._outstanding == 0, timeout)
+        finally:
+            self._flushing = False
+
+    def close(self, timeout: float = 5.0):
+        """Give pending messages a last chance to go out; anything left stays spooled for the next start."""
+        if self._spooler is None:
+            return
+        self.flush(timeout)
+        self._stopping = True
+        # Everything queued before the sentinel is spooled before the spooler exits
+        self._queue.put(None)
+        self._wake.set()
+        self._spooler.join(timeout=timeout)
+        self._sender.join(timeout=1.0)
+
+    # -------------------- worker threads --------------------
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit: writes run in explicit BEGIN IMMEDIATE transactions
+        conn = sqlite3.connect(self.spool_path, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        deadline = time.time() + 5.0
+        while conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            try:
+                conn.execute("PRAGMA journal_mode = WAL")
+            except sqlite3.OperationalError:
+                # Another connection is switching a new spool file to WAL; the busy timeout doesn't cover this
+                if time.time() > deadline:
+                    conn.close()
+                    raise
+                time.sleep(0.01)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS spool (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL,
+                    message TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    not_before REAL NOT NULL DEFAULT 0,
+                    claimed_by TEXT,
+                    claimed_at REAL
+                )
+            """)
+            # Migration for spools created before rows were claimed
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(spool)").fetchall()}
+            for name, declaration in (("not_before", "REAL NOT NULL DEFAULT 0"), ("claimed_by", "TEXT"), ("claimed_at", "REAL")):
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE spool ADD COLUMN {name} {declaration}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            conn.close()
+            raise
+        return conn
+
+    def _spool_loop(self):
+        """Write each message to the spool as soon as it is dequeued."""
+        conn = self._connect()
+        try:
+            while True:
+                items = [self._queue.get()]
+                # Whatever else is already queued goes into the same commit
+                while items[-1] is not None:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                messages = [item for item in items if item is not None]
+                if messages:
+                    # Waiting for the write lock happens here, without holding self._done (notify() takes it)
+                    conn.execute("BEGIN IMMEDIATE")
+                    ids = [conn.execute("INSERT INTO spool (created_at, message) VALUES (?, ?)", item).lastrowid
+                           for item in messages]
+                    with self._done:
+                        # Registered and committed under one lock hold: the sender never sees an
+                        # unregistered row, nor a registered row that is not visible yet
+                        self._live_ids.update(ids)
+                        conn.execute("COMMIT")
+                    self._wake.set()
+                if items[-1] is None:
+                    return
+        finally:
+            conn.close()
+
+    def _send_loop(self):
+        """Coalesce claimable spooled rows at send time, claim them and deliver them."""
+        conn = self._connect()
+        try:
+            while not self._stopping:
+                self._wake.clear()
+                self._settle_delivered(conn)
+                now = time.time()
+                rows = conn.execute("SELECT id, created_at, not_before FROM spool WHERE claimed_by IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                                    (now - self.claim_seconds, self.max_batch)).fetchall()
+                if not rows:
+                    # Idle: sleep until a message is spooled or close(); poll while a sibling may be delivering ours
+                    self._wake.wait(SETTLE_POLL_SECONDS if self._live_ids else None)
+                    continue
+                # Rows that failed wait out their backoff
+                send_at = max(not_before for _, _, not_before in rows)
+                if len(rows) < self.max_batch and not self._flushing:
+                    # Let a burst accumulate: the oldest row waits out the coalescing window
+                    send_at = max(send_at, rows[0][1] + self.coalesce_seconds)
+                if now < send_at:
+                    self._wake.wait(min(send_at - now, SETTLE_POLL_SECONDS) if self._live_ids else send_at - now)
+                    continue
+                claimed = self._claim(conn)
+                if claimed:
+                    self._deliver(conn, claimed)
+        finally:
+            conn.close()
+
+    def _claim(self, conn: sqlite3.Connection) -> List[Tuple[int, str, int]]:
+        """Take the oldest due rows for this dispatcher in one write transaction, so no other process posts them."""
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("""
+                SELECT id, message, attempts FROM spool
+                WHERE (claimed_by IS NULL OR claimed_at < ?) AND not_before <= ?
+                ORDER BY id LIMIT ?
+            """, (now - self.claim_seconds, now, self.max_batch)).fetchall()
+            if rows:
+                ids = [row_id for row_id, _, _ in rows]
+                placeholders = ",".join("?" * len(ids))
+                conn.execute(f"UPDATE spool SET claimed_by = ?, claimed_at = ? WHERE id IN ({placeholders})",
+                             [self._owner, now, *ids])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _deliver(self, conn: sqlite3.Connection, rows: List[Tuple[int, str, int]]):
+        """
+        POST claimed rows as few messages as the size limit allows, deleting
+        each body's rows once it is accepted or rejected. On a retryable
+        failure the rest are released with their attempts counted and a
+        backoff before any process may claim them again.
+        """
+        if not self.token or not self.user:
+            print("Pushover credentials missing; dropping notification(s)", flush=True)
+            self._remove(conn, [row_id for row_id, _, _ in rows])
+            return
+        attempts = {row_id: n for row_id, _, n in rows}
+        bodies = _pack([(row_id, text) for row_id, text, _ in rows])
+        for i, (message, ids) in enumerate(bodies):
+            try:
+                resp = requests.post(PUSHOVER_URL, data={"token": self.token, "user": self.user, "message": message},
+                                     timeout=self.request_timeout)
+                status = resp.status_code
+            except requests.RequestException as e:
+                print(f"Pushover request failed: {e}", flush=True)
+                status = None
+            if status is None or status == 429 or status >= 500:
+                if status is not None:
+                    print(f"Pushover returned {status}; will retry", flush=True)
+                self.failed_attempts += 1
+                remaining = [row_id for _, later in bodies[i:] for row_id in later]
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** max(attempts[r] for r in remaining))
+                placeholders = ",".join("?" * len(remaining))
+                conn.execute(f"""
+                    UPDATE spool SET attempts = attempts + 1, not_before = ?, claimed_by = NULL, claimed_at = NULL
+                    WHERE id IN ({placeholders})
+                """, [time.time() + backoff * random.uniform(0.5, 1.0), *remaining])
+                return
+            if status >= 400:
+                print(f"Pushover rejected notification ({status}): {resp.text[:200]}", flush=True)
+            else:
+                self.sent += len(ids)
+            self._remove(conn, ids)
+
+    def _remove(self, conn: sqlite3.Connection, ids: List[int]):
+        placeholders = ",".join("?" * len(ids))
+        conn.execute(f"DELETE FROM spool WHERE id IN ({placeholders})", ids)
+        self._settle(ids)
+
+    def _settle_delivered(self, conn: sqlite3.Connection):
+        """Settle this process's messages that are gone from the spool: another process delivered them."""
+        with self._done:
+            live = list(self._live_ids)
+        present = set()
+        for start in range(0, len(live), 500):
+            chunk = live[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            present.update(row_id for (row_id,) in conn.execute(f"SELECT id FROM spool WHERE id IN ({placeholders})", chunk))
+        self._settle([row_id for row_id in live if row_id not in present])
+
+    def _settle(self, ids: List[int]):
+        with self._done:
+            settled = sum(1 for row_id in ids if row_id in self._live_ids)
+            self._live_ids.difference_update(ids)
+            if settled:
+                self._outstanding -= settled
+                self._done.notify_all()
+
+
+def _pack(rows: List[Tuple[int, str]]) -> List[Tuple[str, List[int]]]:
+    """Join (id, message) rows into as few Pushover-sized bodies as possible, each with the ids it carries."""
+    if len(rows) == 1:
+        row_id, text = rows[0]
+        return [(text[:PUSHOVER_MAX_CHARS], [row_id])]
+    bodies: List[Tuple[str, List[int]]] = []
+    current, ids = "", []
+    for row_id, text in rows:
+        line = f"• {text}"[:PUSHOVER_MAX_CHARS]
+        if current and len(current) + 1 + len(line) > PUSHOVER_MAX_CHARS:
+            bodies.append((current, ids))
+            current, ids = line, [row_id]
+        else:
+            current = f"{current}\n{line}" if current else line
+            ids.append(row_id)
+    if current:
+        bodies.append((current, ids))
+    return bodies
+
+
+_dispatcher: Optional[PushoverDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(default_spool: str) -> PushoverDispatcher:
+    """Process-wide dispatcher spooling to default_spool (PUSH_SPOOL_PATH overrides)."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                spool = os.getenv("PUSH_SPOOL_PATH", default_spool)
+                os.makedirs(os.path.dirname(spool) or ".", exist_ok=True)
+                _dispatcher = PushoverDispatcher(spool)
+                atexit.register(_dispatcher.close)
+    return _dispatcher
@@ -1,8 +1,7 @@
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
-import requests
-import os
+from .notifier import get_dispatcher
 
 
 class PushNotification(BaseModel):
@@ -17,11 +16,7 @@ class PushNotificationTool(BaseTool):
     args_schema: Type[BaseModel] = PushNotification
 
     def _run(self, message: str) -> str:
-        pushover_user = os.getenv("PUSHOVER_USER")
-        pushover_token = os.getenv("PUSHOVER_TOKEN")
-        pushover_url = "https://api.pushover.net/1/messages.json"
-
         print(f"Push: {message}")
-        payload = {"user": pushover_user, "token": pushover_token, "message": message}
-        requests.post(pushover_url, data=payload)
+        # Queued for the background dispatcher; it batches, retries and flushes at exit
+        get_dispatcher("./memory/push_spool.db").notify(message)
         return '{"notification": "ok"}'